@@ -1,15 +1,162 @@
+import signal
+import sys
+import threading
 import traceback
 
 import utils.utils as utils
+from recorders.control import ControlServer
 from recorders.recorders import *
+from recorders.uploader import get_backend
+from utils.config import ConfigError, get_channel_key, load_config
 from utils.utils import logutil
 
+reload_requested = threading.Event()
+# Platforms the CLI knows that have a recorder class in this build
+PLATFORMS = [p for p in utils.PLATFORM_CHOICES if p in globals()]
+
+
+def check_channel(user) -> list:
+    """Problems that would otherwise only show when the watcher is built"""
+    errors = []
+    if user["platform"] not in PLATFORMS:
+        errors.append(f"platform '{user['platform']}' is not supported yet, use one of {PLATFORMS}")
+    if user.get("cookies"):
+        try:
+            if not load_cookies(user["cookies"]):
+                errors.append(f"no cookies found in '{user['cookies']}'")
+        except (OSError, ValueError) as e:
+            errors.append(f"cannot read cookies '{user['cookies']}': {e}")
+    if user.get("upload"):
+        try:
+            get_backend(user["upload"])
+        except (OSError, ValueError) as e:
+            errors.append(f"invalid upload destination: {e}")
+    return errors
+
+
+def create_watcher(user):
+    if user["platform"] not in PLATFORMS:
+        raise ValueError(f"Platform {user['platform']} is not supported yet")
+    platform = globals()[user["platform"]]
+    return platform(user)
+
+
+def create_watchers(users) -> list:
+    """Build one watcher per channel; a channel that fails is logged and left out"""
+    watchers = []
+    for user in users:
+        try:
+            watchers.append(create_watcher(user))
+        except Exception as e:
+            logutil.error(f"[{user['platform']}][{user['id']}]", f"Cannot start watcher: {e}")
+    return watchers
+
+
+def run_watcher(watcher):
+    """Thread target: a watcher that dies on a fatal error is logged like main() logs one, and leaves its room"""
+    try:
+        watcher.run()
+    except Exception as e:
+        logutil.exception(watcher.flag, f"Watcher stopped: {e}")
+        watcher.leave_room()
+        watcher.finish_recording()
+
+
+def start_watcher(watcher, threads):
+    thread = threading.Thread(target=run_watcher, args=(watcher,), name=watcher.flag, daemon=True)
+    thread.start()
+    threads[watcher] = thread
+
+
+def reload_config(path, watchers, threads, process_args):
+    """Re-read the config file; running watchers are updated in place, never restarted.
+    Watchers that died were dropped from the list, so their channels come back as new ones.
+    """
+    try:
+        channels = {get_channel_key(user): {**user, **process_args} for user in load_config(path, check_channel)}
+    except ConfigError as e:
+        logutil.error(f"Config reload failed, keeping current settings:\n{e}")
+        return
+    logutil.info(f"Reloading config {path}")
+    for w in list(watchers):
+        user = channels.pop(get_channel_key(w.user), None)
+        if user is None:
+            logutil.info(w.flag, "Removed from config, stopping after the current recording")
+            w.retire()
+            watchers.remove(w)
+            continue
+        try:
+            w.configure(user)
+        except Exception as e:
+            logutil.error(w.flag, f"Cannot apply new settings: {e}")
+    for w in create_watchers(channels.values()):
+        logutil.info(w.flag, "Added from config")
+        watchers.append(w)
+        start_watcher(w, threads)
+
+
+def run_watchers(watchers, config=None, process_args=None):
+    """Run several watchers in one process so duplicate rooms share a single capture.
+    Room sharing is process-local; a second recorder process pulls its own copy.
+    """
+    threads = {}
+    for w in watchers:
+        start_watcher(w, threads)
+    try:
+        while watchers or any(t.is_alive() for t in threads.values()):
+            if reload_requested.wait(1):
+                reload_requested.clear()
+                reload_config(config, watchers, threads, process_args or {})
+            for w, t in threads.items():
+                if not t.is_alive() and w in watchers:
+                    logutil.error(w.flag, "Dropped after a fatal error" + (", a config reload starts it again" if config else ""))
+                    watchers.remove(w)
+            # Retired watchers are gone from the list but may still be finishing a recording
+            threads = {w: t for w, t in threads.items() if t.is_alive()}
+        logutil.error("No watchers left, exiting")
+    except KeyboardInterrupt:
+        logutil.warning("Stopped by keyboard interrupt.")
+        for w in watchers:
+            w.running = False
+        # ffmpeg received the same interrupt; let the captures close their files first
+        for t in threads.values():
+            t.join(WaitTime.SHORT)
+        for w in watchers:
+            w.finish_recording()
+            w.finisher.shutdown()
+        sys.exit(0)
+
 
 def main():
     try:
         args = utils.parse_args()
-        platform = globals()[args.get("platform")]
-        platform(args).run()
+        config = args.get("config")
+        # Process-wide options that every watcher needs to know about
+        process_args = {key: args[key] for key in ("control",) if key in args}
+        if config:
+            users = [{**user, **process_args} for user in load_config(config, check_channel)]
+        else:
+            # CLI watchers share one set of settings, so a repeated ID would only record the same file twice.
+            # Distinct consumers of one room (other format or output) are configured with --config.
+            users = [{**args, "id": id} for id in dict.fromkeys(args["id"])]
+        watchers = create_watchers(users)
+        if not watchers:
+            return
+        if args.get("control"):
+            ControlServer(watchers, args["control"]).start()
+        if config:
+            if hasattr(signal, "SIGHUP"):
+                signal.signal(signal.SIGHUP, lambda signum, frame: reload_requested.set())
+                logutil.info(f"Loaded {len(watchers)} channel(s) from {config}, send SIGHUP to reload")
+            else:
+                logutil.info(f"Loaded {len(watchers)} channel(s) from {config}")
+            run_watchers(watchers, config, process_args)
+        elif len(watchers) == 1:
+            watchers[0].run()
+        else:
+            run_watchers(watchers)
+    except ConfigError as e:
+        logutil.error(f"Invalid config:\n{e}")
     except Exception as ex:
         logutil.error("Exception caught in main:")
         logutil.error(f"{ex}\n")
@@ -0,0 +1,141 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from recorders.recorders import CaptureAction
+from utils.utils import logutil
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+UNIX_PREFIX = "unix:"
+ACTIONS = ["stop", "restart", "pause", "resume", "interval"]
+CAPTURE_ERRORS = {
+    CaptureAction.NO_CAPTURE: "no capture running",
+    CaptureAction.SHARED: "capture is shared with other watchers of the room; restarting it would end their parts too",
+}
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    """JSON endpoints:
+    GET  /channels                      list every watcher
+    GET  /channels/<id>                 watchers with that ID
+    POST /channels/<id>/stop            force-stop the capture, finish the recording, pause polling;
+                                        202 when the capture is shared and the watcher detaches at the next part
+    POST /channels/<id>/restart         end the current part and start a new one
+    stop and restart answer 409 when there is no capture (or, for restart, it is shared)
+    POST /channels/<id>/pause|resume    pause or resume polling
+    POST /channels/<id>/interval        body {"interval": 30} or ?interval=30
+    """
+
+    def do_GET(self):
+        parts = self.get_parts()
+        if parts == ["channels"]:
+            return self.reply(200, [w.describe() for w in self.server.watchers])
+        if len(parts) == 2 and parts[0] == "channels":
+            watchers = self.find(parts[1])
+            if watchers:
+                return self.reply(200, [w.describe() for w in watchers])
+        self.reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        parts = self.get_parts()
+        if len(parts) != 3 or parts[0] != "channels" or parts[2] not in ACTIONS:
+            return self.reply(404, {"error": "not found"})
+        watchers = self.find(parts[1])
+        if not watchers:
+            return self.reply(404, {"error": f"channel {parts[1]} not found"})
+        action = parts[2]
+        results = []
+        try:
+            for w in watchers:
+                result = CaptureAction.DONE
+                if action == "stop":
+                    result = w.stop()
+                elif action == "restart":
+                    result = w.restart_capture()
+                elif action == "pause":
+                    w.pause()
+                elif action == "resume":
+                    w.resume()
+                elif action == "interval":
+                    w.set_interval(self.get_param("interval"))
+                logutil.info(w.flag, f"Control API: {action} ({result.name})")
+                results.append(result)
+        except (TypeError, ValueError) as e:
+            return self.reply(400, {"error": str(e)})
+
+        body = [{**w.describe(), "result": r.name} for w, r in zip(watchers, results)]
+        if all(r in CAPTURE_ERRORS for r in results):
+            return self.reply(409, {"error": CAPTURE_ERRORS[results[0]], "channels": body})
+        self.reply(202 if CaptureAction.DEFERRED in results else 200, body)
+
+    def get_parts(self) -> list:
+        return [p for p in urlparse(self.path).path.split("/") if p]
+
+    def get_param(self, key):
+        query = parse_qs(urlparse(self.path).query)
+        if key in query:
+            return query[key][0]
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        if key not in body:
+            raise ValueError(f"missing {key}")
+        return body[key]
+
+    def find(self, id) -> list:
+        return [w for w in self.server.watchers if w.id == id]
+
+    def reply(self, code, data):
+        body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) pair
+        return self.client_address[0] if isinstance(self.client_address, tuple) else UNIX_PREFIX
+
+    def log_message(self, format, *args):
+        logutil.debug(f"[control] {self.address_string()} {format % args}")
+
+
+if hasattr(socket, "AF_UNIX"):
+
+    class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+class ControlServer:
+    """Local control API over TCP ("host:port") or a Unix socket ("unix:/path/to.sock")"""
+
+    def __init__(self, watchers, address=f"{DEFAULT_HOST}:{DEFAULT_PORT}"):
+        self.watchers = watchers
+        self.address = address
+        self.server = None
+
+    def start(self):
+        if self.address.startswith(UNIX_PREFIX):
+            if not hasattr(socket, "AF_UNIX"):
+                raise ValueError("Unix sockets are not supported on this platform")
+            path = self.address[len(UNIX_PREFIX) :]
+            if os.path.exists(path):
+                os.remove(path)
+            self.server = UnixHTTPServer(path, ControlHandler)
+        else:
+            host, _, port = self.address.rpartition(":")
+            self.server = ThreadingHTTPServer((host or DEFAULT_HOST, int(port or DEFAULT_PORT)), ControlHandler)
+        # The list is shared, so watchers added later are visible to the API
+        self.server.watchers = self.watchers
+        threading.Thread(target=self.server.serve_forever, name="control", daemon=True).start()
+        logutil.info(f"Control API listening on {self.address}")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,376 @@
+import glob
+import json
+import os
+import struct
+import subprocess
+
+import ffmpeg
+
+from utils.utils import logutil
+
+TS_PACKET_SIZE = 188
+DEFAULT_MAX_GAP = 5.0
+# Audio and video jump at nearly the same offset; jumps closer than this are one cut
+CLUSTER_SIZE = 1048576
+COPY_CHUNK_SIZE = 4194304
+PACKET_ENTRIES = "packet=stream_index,dts_time,duration_time,size,pos"
+FLV_TAG_TYPES = (8, 9, 18)
+FLV_HEADER_SIZE = 13
+FLV_TAG_HEADER_SIZE = 11
+REPORT_SUFFIX = ".integrity.json"
+
+
+def scan_file(path, max_gap=DEFAULT_MAX_GAP) -> dict:
+    """Scan container packets without decoding and report timestamp discontinuities and a truncated tail"""
+    report = {
+        "file": path,
+        "size": os.path.getsize(path),
+        "packets": 0,
+        "discontinuities": [],
+        "truncated": is_truncated(path),
+        "errors": [],
+        "skipped": [],
+        "repaired": [],
+        "verified": [],
+        "fixed": False,
+        "ok": True,
+    }
+    cmd = ["ffprobe", "-v", "error", "-show_entries", PACKET_ENTRIES, "-of", "csv=p=0", path]
+    # stderr is merged so a chatty broken file can't fill an unread pipe; error lines simply don't parse as packets
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding="utf-8", errors="replace")
+    last_dts = {}
+    for line in proc.stdout:
+        line = line.strip()
+        if not line:
+            continue
+        packet = parse_packet(line)
+        if packet is None:
+            report["errors"].append(line)
+            continue
+        stream, dts, size, pos = packet
+        report["packets"] += 1
+        if dts is None:
+            continue
+        prev = last_dts.get(stream)
+        if prev is not None:
+            jump = dts - prev
+            if jump < 0 or jump > max_gap:
+                report["discontinuities"].append({"stream": stream, "pos": pos, "time": prev, "jump": round(jump, 3)})
+        last_dts[stream] = dts
+    proc.wait()
+
+    # An mp4 killed before its moov was written can't be probed at all; that is still a truncated file, not a scan failure
+    if proc.returncode != 0 and report["packets"] == 0 and not report["truncated"]:
+        raise ValueError(f"ffprobe could not read {path}: {' '.join(report['errors'])}")
+    report["ok"] = not report["discontinuities"] and not report["truncated"]
+    return report
+
+
+def parse_packet(line):
+    """Parse one csv packet line from ffprobe, returning None for anything else"""
+    fields = line.split(",")
+    if len(fields) != 5:
+        return None
+    try:
+        stream = int(fields[0])
+        dts = None if fields[1] == "N/A" else float(fields[1])
+        size = None if fields[3] == "N/A" else int(fields[3])
+        pos = None if fields[4] == "N/A" else int(fields[4])
+        return stream, dts, size, pos
+    except ValueError:
+        return None
+
+
+def is_truncated(path) -> bool:
+    """Check the container framing at the end of the file; ffprobe never reports packets past EOF"""
+    ext = os.path.splitext(path)[1].lower()
+    size = os.path.getsize(path)
+    if ext == ".ts":
+        return size % TS_PACKET_SIZE != 0
+    with open(path, "rb") as f:
+        if ext == ".flv":
+            return is_flv_truncated(f, size)
+        if ext == ".mp4":
+            return is_mp4_truncated(f, size)
+    return False
+
+
+def is_flv_truncated(f, size) -> bool:
+    """A complete FLV ends with the PreviousTagSize of a whole last tag"""
+    if size < 13:
+        return True
+    f.seek(size - 4)
+    prev_size = struct.unpack(">I", f.read(4))[0]
+    if prev_size == 0:
+        # Header only, no tags
+        return size != 13
+    start = size - 4 - prev_size
+    if start < 9:
+        return True
+    f.seek(start)
+    header = f.read(4)
+    data_size = int.from_bytes(header[1:4], "big")
+    return (header[0] & 0x1F) not in FLV_TAG_TYPES or data_size + 11 != prev_size
+
+
+def is_mp4_truncated(f, size) -> bool:
+    """A complete MP4 has a moov box and no top-level box running past EOF"""
+    pos = 0
+    has_moov = False
+    while pos < size:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return True
+        box_size, box_type = struct.unpack(">I4s", header)
+        if box_size == 1:
+            large = f.read(8)
+            if len(large) < 8:
+                return True
+            box_size = struct.unpack(">Q", large)[0]
+        elif box_size == 0:
+            # Box extends to EOF
+            box_size = size - pos
+        if box_size < 8 or pos + box_size > size:
+            return True
+        has_moov = has_moov or box_type == b"moov"
+        pos += box_size
+    return not has_moov
+
+
+def repair_file(path, report) -> list:
+    """Fix the problems found by scan_file and return the files that replace path.
+    Each file is scanned again afterwards; report["fixed"] is only set when all of them came out clean.
+    """
+    if report["ok"]:
+        return [path]
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".ts":
+        pieces = split_ts(path, report)
+    elif ext == ".flv":
+        pieces = split_flv(path, report)
+    elif report["discontinuities"]:
+        pieces = split_by_time(path, report)
+    else:
+        pieces = [remux(path, report)]
+    verify(pieces, report)
+    return pieces
+
+
+def verify(pieces, report):
+    """Scan the repaired files and record whether the repair actually removed every problem"""
+    report["verified"] = []
+    for piece in pieces:
+        try:
+            piece_report = scan_file(piece)
+        except ValueError as e:
+            report["errors"].append(str(e))
+            piece_report = {"file": piece, "ok": False}
+        report["verified"].append({key: piece_report[key] for key in ("file", "discontinuities", "truncated", "ok") if key in piece_report})
+    report["fixed"] = all(r["ok"] for r in report["verified"])
+
+
+def get_cut_points(report, good_size, boundaries=None) -> list:
+    """Byte offsets to cut at, one per cluster of discontinuities, aligned to TS packets or to the given FLV tag starts"""
+    points = []
+    for pos in sorted({d["pos"] for d in report["discontinuities"] if d["pos"] is not None}):
+        if boundaries is None:
+            pos -= pos % TS_PACKET_SIZE
+        elif pos not in boundaries:
+            report["skipped"].append({"pos": pos, "reason": "not at a tag boundary"})
+            continue
+        if pos <= (0 if boundaries is None else FLV_HEADER_SIZE) or pos >= good_size:
+            # Nothing on one side of the cut; the jump is at the very edge of the file
+            report["skipped"].append({"pos": pos, "reason": "at file edge"})
+            continue
+        if points and pos - points[-1] < CLUSTER_SIZE:
+            continue
+        points.append(pos)
+    return points
+
+
+def copy_range(src, dst, start, end):
+    src.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = src.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        dst.write(chunk)
+        remaining -= len(chunk)
+
+
+def split_ts(path, report) -> list:
+    """Cut a TS file at its discontinuities so the concat demuxer can rebase each piece.
+    A truncated tail is dropped by trimming to the last whole TS packet; nothing is remuxed here.
+    """
+    good_size = report["size"] - report["size"] % TS_PACKET_SIZE
+    points = [0] + get_cut_points(report, good_size) + [good_size]
+
+    if len(points) == 2:
+        if good_size != report["size"]:
+            os.truncate(path, good_size)
+        return [path]
+
+    stem, ext = os.path.splitext(path)
+    pieces = []
+    with open(path, "rb") as src:
+        for i in range(len(points) - 1):
+            piece = f"{stem}.part{i:02d}{ext}"
+            with open(piece, "wb") as dst:
+                copy_range(src, dst, points[i], points[i + 1])
+            pieces.append(piece)
+    os.remove(path)
+    return pieces
+
+
+def read_flv_tags(f, size):
+    """Walk the FLV tags and return (tag starts, end of the last whole tag, leading codec config tags)"""
+    starts = []
+    config = []
+    pos = FLV_HEADER_SIZE
+    while pos + FLV_TAG_HEADER_SIZE <= size:
+        f.seek(pos)
+        header = f.read(FLV_TAG_HEADER_SIZE + 2)
+        tag_type = header[0] & 0x1F
+        end = pos + FLV_TAG_HEADER_SIZE + int.from_bytes(header[1:4], "big") + 4
+        if tag_type not in FLV_TAG_TYPES or end > size:
+            break
+        if len(config) == len(starts) and is_flv_config(tag_type, header[FLV_TAG_HEADER_SIZE:]):
+            config.append(pos)
+        starts.append(pos)
+        pos = end
+    return starts, pos, config
+
+
+def is_flv_config(tag_type, data) -> bool:
+    """Script data and AVC/AAC sequence headers, which every piece of a split FLV needs up front"""
+    if tag_type == 18:
+        return True
+    if tag_type == 9 and len(data) == 2:
+        return data[0] & 0x0F == 7 and data[1] == 0
+    if tag_type == 8 and len(data) == 2:
+        return data[0] >> 4 == 10 and data[1] == 0
+    return False
+
+
+def set_flv_timestamp(tag, timestamp) -> bytes:
+    """Tag header timestamps are 24 bits plus an extended upper byte"""
+    return tag[:4] + (timestamp & 0xFFFFFF).to_bytes(3, "big") + bytes([(timestamp >> 24) & 0xFF]) + tag[8:]
+
+
+def split_flv(path, report) -> list:
+    """Cut an FLV file at its discontinuities, on tag boundaries.
+    Every later piece starts with the file header and codec config tags, restamped to its first tag, so it plays on its own.
+    A truncated tail is dropped by trimming to the last whole tag.
+    """
+    with open(path, "rb") as src:
+        starts, good_size, config = read_flv_tags(src, report["size"])
+        points = [FLV_HEADER_SIZE] + get_cut_points(report, good_size, set(starts)) + [good_size]
+        if len(points) == 2:
+            if good_size != report["size"]:
+                os.truncate(path, good_size)
+            return [path]
+
+        src.seek(0)
+        header = src.read(FLV_HEADER_SIZE)
+        config_tags = []
+        for pos in config:
+            src.seek(pos)
+            tag = src.read(FLV_TAG_HEADER_SIZE)
+            config_tags.append(tag + src.read(int.from_bytes(tag[1:4], "big") + 4))
+
+        stem, ext = os.path.splitext(path)
+        pieces = []
+        for i in range(len(points) - 1):
+            piece = f"{stem}.part{i:02d}{ext}"
+            with open(piece, "wb") as dst:
+                dst.write(header)
+                if i:
+                    src.seek(points[i] + 4)
+                    stamp = src.read(4)
+                    timestamp = int.from_bytes(stamp[:3], "big") | stamp[3] << 24
+                    for tag in config_tags:
+                        dst.write(set_flv_timestamp(tag, timestamp))
+                copy_range(src, dst, points[i], points[i + 1])
+            pieces.append(piece)
+    os.remove(path)
+    return pieces
+
+
+def get_cut_times(report) -> list:
+    """Timestamps just after each forward jump, one per cluster; a container muxed from a live pull has no backward ones"""
+    times = []
+    for d in sorted(report["discontinuities"], key=lambda d: d["time"]):
+        if d["jump"] < 0:
+            report["skipped"].append({"pos": d["pos"], "reason": "backward jump"})
+            continue
+        cut = round(d["time"] + d["jump"], 3)
+        if times and cut - times[-1] < DEFAULT_MAX_GAP:
+            continue
+        times.append(cut)
+    return times
+
+
+def split_by_time(path, report) -> list:
+    """Stream-copy a file that can't be cut by byte offset into pieces at its jumps, with the segment muxer.
+    Timestamps are kept as they are for the cut and reset in each piece, so the concat demuxer can rebase them.
+    """
+    times = get_cut_times(report)
+    if not times:
+        return [remux(path, report)]
+    stem, ext = os.path.splitext(path)
+    # The segment muxer treats '%' in the name as a pattern
+    pattern = stem.replace("%", "%%") + ".part%02d" + ext
+    try:
+        (
+            ffmpeg.input(path, copyts=None, **{"loglevel": "error"})
+            .output(pattern, c="copy", map="0", f="segment", segment_times=",".join(map(str, times)), reset_timestamps=1)
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+    except ffmpeg.Error as e:
+        error = e.stderr.decode("utf-8", errors="replace").strip() if e.stderr else str(e)
+        logutil.error(f"Split failed for {path}: {error}")
+        report["errors"].append(error)
+        for piece in glob.glob(f"{glob.escape(stem)}.part[0-9][0-9]{ext}"):
+            os.remove(piece)
+        return [path]
+    os.remove(path)
+    return sorted(glob.glob(f"{glob.escape(stem)}.part[0-9][0-9]{ext}"))
+
+
+def remux(path, report) -> str:
+    """Stream-copy remux for a truncated file without jumps; the muxer rewrites the index a killed capture never wrote"""
+    stem, ext = os.path.splitext(path)
+    repaired = f"{stem}.repaired{ext}"
+    try:
+        (
+            ffmpeg.input(path, **{"fflags": "+genpts+discardcorrupt"}, **{"loglevel": "error"})
+            .output(repaired, c="copy", **{"avoid_negative_ts": "make_zero"})
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+        os.replace(repaired, path)
+    except ffmpeg.Error as e:
+        error = e.stderr.decode("utf-8", errors="replace").strip() if e.stderr else str(e)
+        logutil.error(f"Remux failed for {path}: {error}")
+        report["errors"].append(error)
+        if os.path.exists(repaired):
+            os.remove(repaired)
+    return path
+
+
+def get_report_file(path) -> str:
+    return path + REPORT_SUFFIX
+
+
+def write_report(path, report):
+    """Keep the report as a sidecar next to the file it describes"""
+    with open(get_report_file(path), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def remove_report(path):
+    if os.path.exists(get_report_file(path)):
+        os.remove(get_report_file(path))
@@ -3,13 +3,21 @@ import json
 import os
 import re
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum, IntEnum
+from functools import partial
+from http.cookiejar import LoadError, MozillaCookieJar
 
 import ffmpeg
 import requests
 from bs4 import BeautifulSoup
 
+from recorders import integrity, thumbnails
+from recorders.rooms import rooms
+from recorders.transcode import scheduler
+from recorders.uploader import get_uploader
 from utils.utils import logutil
 
 # import bot_utils
@@ -24,42 +32,89 @@ DEFAULT_HEADERS = {
 }
 DEFAULT_OUTPUT = "output"
 DEFAULT_FORMAT = "ts"
+DEFAULT_QUALITY = None
 DEFAULT_PROXY = None
 DEFAULT_COOKIES = None
 DEFAULT_NAME = None
+DEFAULT_PROFILES = []
+DEFAULT_UPLOAD = None
+DEFAULT_UPLOAD_RATE = 0
+DEFAULT_THUMBNAILS = 0
+DEFAULT_PREVIEW = 0
+QUALITY_KEYS = {"full_hd": "FULL_HD1", "hd": "HD1", "sd": "SD1", "ld": "SD2"}
 
 
 class TikTok:
     def __init__(self, user: dict):
         self.platform = user["platform"]
         self.id = user["id"]
-
-        self.name = user.get("name", DEFAULT_NAME)
-        self.interval = user.get("interval", DEFAULT_INTERVAL)
-        self.headers = user.get("headers", DEFAULT_HEADERS)
-        self.cookies = user.get("cookies", DEFAULT_COOKIES)
-        self.format = user.get("format", DEFAULT_FORMAT)
-        self.proxy = user.get("proxy", DEFAULT_PROXY)
-        self.output = user.get("output", DEFAULT_OUTPUT)
+        self.name = DEFAULT_NAME
+        self.control = user.get("control") is not None
+        self.configure(user)
 
         self.flag = f"[{self.platform}][{self.id}]"
 
         self.room_id = None
-
-        self.req = requests
-        if self.proxy:
-            self.req = get_proxy_session(self.proxy)
+        self.room = None
+        self.running = True
+        self.retired = False
 
         self.status = LiveStatus.BOT_INIT
         self.out_file = None
-        self.video_list = [str]
+        self.video_list = []
+        self.integrity = {}
+        self.session = None
+
+        self.paused = False
+        self.stopping = False
+        self.proc = None
+        self.bitrate = None
+        self.writer = None
+        self.capture_consumers = []
+        # One worker keeps a watcher's part checks, uploads and concat in order without blocking its poll loop
+        self.finisher = ThreadPoolExecutor(1, thread_name_prefix=f"finish-{self.id}")
+        # The room owner closes parts and finishes sessions for its followers, from its own thread
+        self.session_lock = threading.Lock()
+        # A session keeps the upload destination it started with, even if a reload changes it
+        self.session_uploader = None
+
+    def configure(self, user: dict):
+        """Apply channel settings; on reload they take effect from the next poll or recorded part"""
+        self.user = user
+        self.name = user.get("name", self.name)
+        self.interval = user.get("interval", DEFAULT_INTERVAL)
+        self.headers = {**DEFAULT_HEADERS, **user.get("headers", {})}
+        self.cookies = user.get("cookies", DEFAULT_COOKIES)
+        self.format = user.get("format", DEFAULT_FORMAT)
+        self.quality = user.get("quality", DEFAULT_QUALITY)
+        self.proxy = user.get("proxy", DEFAULT_PROXY)
+        self.output = user.get("output", DEFAULT_OUTPUT)
+        self.profiles = user.get("profiles", DEFAULT_PROFILES)
+        self.thumbnails = user.get("thumbnails", DEFAULT_THUMBNAILS)
+        self.preview = user.get("preview", DEFAULT_PREVIEW)
+        self.upload = user.get("upload", DEFAULT_UPLOAD)
+        self.upload_delete = user.get("upload_delete", False)
+        self.uploader = get_uploader(self.upload, user.get("upload_rate", DEFAULT_UPLOAD_RATE) * 1024) if self.upload else None
+
+        req = get_proxy_session(self.proxy) if self.proxy else requests.session()
+        if self.cookies:
+            req.cookies.update(load_cookies(self.cookies))
+        self.req = req
+
+    def retire(self):
+        """Stop watching once the current recording part has closed, then finish the recording"""
+        self.retired = True
+        self.running = False
 
     def run(self):
         if not os.path.exists(self.output):
             os.makedirs(self.output)
 
-        while True:
+        while self.running:
             try:
+                if self.paused:
+                    self.hold()
+                    continue
                 if self.status == LiveStatus.LAGGING:
                     retry_wait(WaitTime.LAG, False)
                 if not self.room_id:
@@ -72,14 +127,16 @@ class TikTok:
                     logutil.info(self.flag, f"Username: {self.name}")
                     logutil.info(self.flag, f"Room ID: {self.room_id}")
 
+                if not self.join_room():
+                    retry_wait(self.interval, False)
+                    continue
+
                 self.status = self.is_user_live()
 
                 if self.status == LiveStatus.OFFLINE:
                     logutil.info(self.flag, f"{self.name} is offline")
                     self.room_id = None
-                    if self.out_file:
-                        self.finish_recording()
-                    else:
+                    if not self.close_room():
                         retry_wait(self.interval, False)
                 elif self.status == LiveStatus.LAGGING:
                     live_url = self.get_live_url()
@@ -96,9 +153,11 @@ class TikTok:
                 else:
                     logutil.error(self.flag, e)
                 self.room_id = None
+                self.leave_room()
                 retry_wait(self.interval)
             except Blacklisted as e:
                 logutil.error(self.flag, ErrorMsg.BLKLSTD_AUTO_MODE_ERROR)
+                self.leave_room()
                 raise e
             except KeyboardInterrupt:
                 logutil.warning(self.flag, "Stopped by keyboard interrupt.")
@@ -106,6 +165,125 @@ class TikTok:
             except Exception as e:
                 logutil.error(self.flag, f"Unexpected error: {e}")
                 retry_wait(self.interval)
+        self.leave_room()
+        if self.retired:
+            while self.writer is not None:
+                time.sleep(1)
+            self.finish_recording()
+            self.finisher.shutdown()
+
+    def hold(self):
+        """Idle while paused, finishing a force-stopped recording once its capture has closed"""
+        if self.room:
+            self.leave_room()
+        if self.stopping and self.writer is None:
+            self.stopping = False
+            self.finish_recording()
+        time.sleep(1)
+
+    def describe(self) -> dict:
+        """Current state of this watcher for the control API"""
+        writer = self.writer
+        return {
+            "platform": self.platform,
+            "id": self.id,
+            "name": self.name,
+            "room_id": self.room_id,
+            "status": self.status.name,
+            "paused": self.paused,
+            "interval": self.interval,
+            "file": self.out_file if writer else None,
+            "bitrate": writer.bitrate if writer else None,
+            "captured_by": writer.flag if writer and writer is not self else None,
+            "parts": len(self.video_list),
+            # Filled in by the finisher thread
+            "integrity": {f: r["ok"] for f, r in list(self.integrity.items())},
+        }
+
+    def stop_capture(self):
+        """Quit the ffmpeg process writing this watcher's file, unless other watchers' files are in it too"""
+        writer = self.writer
+        proc = writer.proc if writer else None
+        if proc is None:
+            return CaptureAction.NO_CAPTURE
+        if writer.capture_consumers != [self]:
+            return CaptureAction.SHARED
+        logutil.info(self.flag, "Stopping capture")
+        try:
+            if proc.stdin:
+                # 'q' lets ffmpeg finalize the container, unlike a kill
+                proc.stdin.write(b"q")
+                proc.stdin.flush()
+            else:
+                proc.terminate()
+        except (BrokenPipeError, OSError):
+            proc.terminate()
+        return CaptureAction.DONE
+
+    def restart_capture(self):
+        """End the current part; the run loop starts a new one right away.
+        A shared capture is left alone, since every other watcher of the room would lose its part too.
+        """
+        return self.stop_capture()
+
+    def stop(self):
+        """Force-stop this watcher's capture, finish the recording and pause polling.
+        From a shared capture the watcher detaches at the next part boundary instead of ending it for everyone.
+        """
+        if self.writer is None:
+            return CaptureAction.NO_CAPTURE
+        self.paused = True
+        self.stopping = True
+        # hold() leaves the room, so the owner's next part no longer includes this watcher
+        return CaptureAction.DEFERRED if self.stop_capture() == CaptureAction.SHARED else CaptureAction.DONE
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def set_interval(self, seconds):
+        seconds = int(seconds)
+        if seconds <= 0:
+            raise ValueError("interval must be a positive number of seconds")
+        self.interval = seconds
+
+    def join_room(self) -> bool:
+        """Register with the room of room_id and return True if this watcher should capture it"""
+        # Followers record the owner's pull, so only watchers asking for the same rendition can share one
+        key = (self.room_id, self.quality)
+        was_follower = self.room is not None and self.room.room_id == key and self.room.owner is not self
+        self.room = rooms.join(key, self)
+        owner = self.room.owner
+        if owner is self:
+            return True
+        if not was_follower:
+            logutil.info(self.flag, f"Room {self.room_id} is already captured by {owner.flag}, sharing its stream")
+        # Mirror the owner so a follower doesn't keep reporting itself as initializing
+        self.status = owner.status if owner.status != LiveStatus.BOT_INIT else LiveStatus.OFFLINE
+        return False
+
+    def leave_room(self):
+        """Stop sharing the room; another watcher takes over the capture if one is left"""
+        rooms.leave(self)
+        self.room = None
+
+    def close_room(self) -> bool:
+        """Finish the recordings of every watcher of the room and return True if there were any"""
+        watchers = rooms.close(self.room) if self.room else [self]
+        if self not in watchers:
+            watchers.insert(0, self)
+        finished = False
+        for w in watchers:
+            w.room = None
+            w.room_id = None
+            finished = w.finish_recording() or finished
+        return finished
+
+    def consumers(self) -> list:
+        """Watchers fed by this watcher's capture"""
+        return list(self.room.watchers) if self.room and self.room.owner is self else [self]
 
     def start_recording(self, live_url):
         """Start recording live"""
@@ -115,13 +293,27 @@ class TikTok:
         # self.out_file = f"{self.output}{self.name}_{current_date}{suffix}.mp4"
 
         title = self.get_title(self.room_id)
-        output_file = self.get_filename(self.flag, title, self.format)
-        self.out_file = os.path.join(self.output, output_file)
+        consumers = []
+        for w in self.consumers():
+            output_file = w.get_filename(w.flag, title, w.format)
+            w.out_file = os.path.join(w.output, output_file)
+            # Watchers with identical settings would write the same file; record it once
+            if any(c.out_file == w.out_file for c in consumers):
+                w.out_file = None
+                continue
+            if w.session is None:
+                # Thumbnails and the preview are named after the first part of the session
+                w.session = os.path.splitext(w.out_file)[0]
+            consumers.append(w)
 
         if self.status is not LiveStatus.LAGGING:
-            logutil.info(self.flag, f"Output directory: {self.output}")
+            for w in consumers:
+                logutil.info(w.flag, f"Output directory: {w.output}")
+        self.capture_consumers = consumers
+        for w in consumers:
+            w.writer = self
         try:
-            self.handle_recording_ffmpeg(live_url)
+            self.handle_recording_ffmpeg(live_url, consumers)
 
         except StreamLagging:
             logutil.info(self.flag, "Stream lagging")
@@ -138,30 +330,47 @@ class TikTok:
 
         self.status = LiveStatus.LAGGING
 
-        try:
-            if os.path.getsize(self.out_file) < 1048576:
-                os.remove(self.out_file)
-                # logutil.info(self.flag, "removed file < 1MB")
-            else:
-                self.video_list.append(self.out_file)
-        except FileNotFoundError:
-            pass
-        except Exception as e:
-            logutil.error(self.flag, e)
+        self.capture_consumers = []
+        for w in consumers:
+            w.writer = None
+            try:
+                if os.path.getsize(w.out_file) < 1048576:
+                    os.remove(w.out_file)
+                    # logutil.info(w.flag, "removed file < 1MB")
+                else:
+                    w.close_part(w.out_file)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logutil.error(w.flag, e)
 
         if should_exit:
-            self.finish_recording()
+            for w in consumers:
+                w.finish_recording()
+                w.finisher.shutdown()
             sys.exit(0)
 
-    def handle_recording_ffmpeg(self, live_url):
+    def handle_recording_ffmpeg(self, live_url, consumers):
         """Show real-time stats and raise ffmpeg errors"""
         stream = ffmpeg.input(
             live_url, **{"loglevel": "error"}, **{"reconnect": 1}, **{"reconnect_streamed": 1}, **{"reconnect_at_eof": 1}, **{"reconnect_delay_max": 5}, **{"timeout": 10000000}, stats=None
         )
         stats_shown = False
-        stream = ffmpeg.output(stream, self.out_file, c="copy")
+        # One pull from the CDN, one stream-copy output per watcher of the room
+        outputs = [ffmpeg.output(stream, w.out_file, c="copy") for w in consumers]
+        thumbnailer = thumbnails.Thumbnailer(self.flag)
+        for w in consumers:
+            thumbnailer.add(w.session, w.format, w.thumbnails, w.preview)
+        if thumbnailer.outputs:
+            # Thumbnails and previews are made by their own process, so they can't fail the capture
+            outputs.append(thumbnails.relay_output(stream))
+        stream = ffmpeg.merge_outputs(*outputs)
+        scheduler.capture_started()
         try:
-            proc = ffmpeg.run_async(stream, pipe_stderr=True)
+            # With the control API there is no console to press 'q' in, so it is sent through stdin instead
+            proc = self.proc = ffmpeg.run_async(stream, pipe_stdin=self.control, pipe_stdout=bool(thumbnailer.outputs), pipe_stderr=True)
+            if thumbnailer.outputs:
+                thumbnailer.start(proc.stdout)
             ffmpeg_err = ""
             last_stats = ""
             text_stream = io.TextIOWrapper(proc.stderr, encoding="utf-8")
@@ -172,9 +381,15 @@ class TikTok:
                     line = line.strip()
                     if "frame=" in line:
                         last_stats = line
+                        match = re.search(r"bitrate=\s*(\S+)", line)
+                        if match:
+                            self.bitrate = match.group(1)
                         if not stats_shown:
                             logutil.info(self.flag, "Started recording")
-                            logutil.info(self.flag, "Press 'q' to re-start recording, CTRL + C to stop")
+                            if self.control:
+                                logutil.info(self.flag, "Use the control API to re-start or stop recording")
+                            else:
+                                logutil.info(self.flag, "Press 'q' to re-start recording, CTRL + C to stop")
                             self.status = LiveStatus.LIVE
                         # logutil.info(self.flag, last_stats, end="\r")
                         logutil.info(self.flag, last_stats)
@@ -191,23 +406,67 @@ class TikTok:
         except ValueError as e:
             logutil.error(self.flag, e)
         finally:
+            scheduler.capture_finished()
+            if thumbnailer.threads:
+                thumbnailer.wait()
+            self.proc = None
+            self.bitrate = None
             if stats_shown:
                 logutil.info(self.flag, last_stats)
 
-    def finish_recording(self):
+    def close_part(self, path):
+        """Queue a closed part for its integrity check and upload"""
+        with self.session_lock:
+            if not self.video_list:
+                self.session_uploader = self.uploader
+            self.video_list.append(path)
+            self.finisher.submit(self.process_part, path, self.integrity, self.session_uploader)
+
+    def process_part(self, path, reports, uploader):
+        """Check one part and upload what came out of it; the uploaded parts are the deliverable"""
+        for f in self.check_part(path, reports):
+            # Transcoding needs the whole recording, so its parts stay local until the concat
+            delete_local = self.upload_delete and not self.profiles
+            self.upload_file(uploader, f, delete_local)
+            if os.path.isfile(integrity.get_report_file(f)):
+                self.upload_file(uploader, integrity.get_report_file(f), delete_local)
+
+    def finish_recording(self) -> bool:
+        """Hand the session over to the finisher thread so polling goes on while it is concatenated.
+        Safe to call from several threads: only the first call after a part was recorded has anything to finish.
+        """
+        with self.session_lock:
+            if not (self.out_file or self.video_list):
+                return False
+            self.finisher.submit(self.finish_session, self.video_list, self.integrity, self.session, self.room_id, self.session_uploader)
+            self.video_list = []
+            self.session_uploader = None
+            self.integrity = {}
+            self.session = None
+            self.out_file = None
+            return True
+
+    def finish_session(self, parts, reports, session, room_id, uploader):
         """Combine multiple videos into one if needed"""
+        # Runs after the session's part checks, which are queued on the same worker
+        files = [f for v in parts for f in (reports.get(v, {}).get("repaired") or [v])]
         try:
+            if uploader:
+                # Concat removes the parts, so let their uploads finish first
+                uploader.wait(files)
+            local = [f for f in files if os.path.isfile(f)]
+            out_file = local[0] if local else None
             current_date = time.strftime("%Y.%m.%d_%H-%M-%S", time.localtime())
             ffmpeg_concat_list = f"{self.name}_{current_date}_concat_list.txt"
-            if len(self.video_list) > 1:
-                title = self.get_title(self.room_id) + "_concat"
+            if len(local) > 1:
+                title = self.get_title(room_id) + "_concat"
                 output_file = self.get_filename(self.flag, title, self.format)
-                self.out_file = os.path.join(self.output, output_file)
-                logutil.info(self.flag, f"Concatenating {len(self.video_list)} video files")
+                out_file = os.path.join(self.output, output_file)
+                logutil.info(self.flag, f"Concatenating {len(local)} video files")
                 with open(ffmpeg_concat_list, "w") as file:
-                    for v in self.video_list:
-                        file.write(f"file '{v}'")
-                proc = ffmpeg.input(ffmpeg_concat_list, **{"f": "concat"}, **{"safe": 0}, **{"loglevel": "error"}).output(self.out_file, c="copy").run_async(pipe_stderr=True)
+                    for v in local:
+                        file.write(f"file '{v}'\n")
+                proc = ffmpeg.input(ffmpeg_concat_list, **{"f": "concat"}, **{"safe": 0}, **{"loglevel": "error"}).output(out_file, c="copy").run_async(pipe_stderr=True)
                 text_stream = io.TextIOWrapper(proc.stderr, encoding="utf-8")
                 ffmpeg_err = ""
                 while True:
@@ -218,11 +477,25 @@ class TikTok:
                 if ffmpeg_err:
                     raise FFmpeg(ffmpeg_err.strip())
                 logutil.info(self.flag, "Concat finished")
-                for v in self.video_list:
+                # The parts' reports move into one sidecar next to the concatenated file
+                integrity.write_report(out_file, {"file": out_file, "parts": list(reports.values())})
+                deleted = 0
+                for v in local:
+                    if uploader and not uploader.is_uploaded(v):
+                        # The next start resumes its upload
+                        logutil.warning(self.flag, f"Keeping {v}, its upload did not complete")
+                        continue
                     os.remove(v)
-                logutil.info(self.flag, f"Deleted {len(self.video_list)} video files")
-            if os.path.isfile(self.out_file):
-                logutil.info(self.flag, f"Recording finished: {self.out_file}")
+                    integrity.remove_report(v)
+                    deleted += 1
+                logutil.info(self.flag, f"Deleted {deleted} video files")
+            if out_file:
+                logutil.info(self.flag, f"Recording finished: {out_file}")
+                # With an uploader the parts went up as they closed; the concat is a local convenience copy
+                if self.profiles:
+                    scheduler.submit(self.flag, out_file, self.profiles, on_done=partial(self.upload_transcoded, uploader, out_file))
+            elif files:
+                logutil.info(self.flag, f"Recording finished: {len(files)} part(s) uploaded")
 
             ffmpeg_concat_list_exists = os.path.exists(ffmpeg_concat_list)
             logutil.info(self.flag, f"ffmpeg_concat_list: {ffmpeg_concat_list}")
@@ -236,8 +509,66 @@ class TikTok:
             logutil.error(self.flag, e)
         except Exception as ex:
             logutil.error(self.flag, ex)
-        self.video_list = []
-        self.out_file = None
+        self.finish_thumbnails(session, uploader)
+
+    def finish_thumbnails(self, session, uploader):
+        """Build the session's sprite sheets and ship them with the preview clip"""
+        if not session:
+            return
+        try:
+            thumb_dir = thumbnails.get_thumb_dir(session)
+            if os.path.isdir(thumb_dir):
+                for sprite in thumbnails.make_sprites(self.flag, thumb_dir, session):
+                    self.upload_file(uploader, sprite)
+            preview_file = thumbnails.get_preview_file(session, self.format)
+            if os.path.isfile(preview_file):
+                logutil.info(self.flag, f"Preview: {preview_file}")
+                self.upload_file(uploader, preview_file)
+        except Exception as e:
+            logutil.error(self.flag, f"Thumbnail error: {e}")
+
+    def upload_file(self, uploader, path, delete_local=False):
+        """Hand a closed file to the session's uploader, if it has one"""
+        if not uploader:
+            return
+        try:
+            uploader.enqueue(path, delete_local)
+        except Exception as e:
+            logutil.error(self.flag, f"Upload error for {path}: {e}")
+
+    def upload_transcoded(self, uploader, source, outputs):
+        for out in outputs:
+            self.upload_file(uploader, out, self.upload_delete)
+        if not outputs:
+            # A failed transcode can only be retried from the source
+            logutil.warning(self.flag, f"Keeping {source}, its transcode failed")
+        elif self.upload_delete and uploader and os.path.exists(source):
+            # The source's parts are already uploaded; it was only kept for the transcode
+            os.remove(source)
+            integrity.remove_report(source)
+            logutil.info(self.flag, f"Deleted local copy {source}")
+
+    def check_part(self, path, reports) -> list:
+        """Validate a recorded file and repair broken timestamps or a truncated tail, returning the files that replace it"""
+        try:
+            report = integrity.scan_file(path)
+            if not report["ok"]:
+                logutil.warning(self.flag, f"Integrity issues in {path}: {len(report['discontinuities'])} discontinuities, truncated tail: {report['truncated']}")
+                report["repaired"] = integrity.repair_file(path, report)
+                if report["fixed"]:
+                    logutil.info(self.flag, f"Repaired {path} into {len(report['repaired'])} file(s)")
+                else:
+                    failed = [r["file"] for r in report["verified"] if not r["ok"]]
+                    logutil.warning(self.flag, f"Repair of {path} did not remove every problem, still broken: {', '.join(failed)}")
+                if report["skipped"]:
+                    logutil.warning(self.flag, f"Left {len(report['skipped'])} discontinuities in {path} uncut: {', '.join(sorted({d['reason'] for d in report['skipped']}))}")
+            reports[path] = report
+            for f in report["repaired"] or [path]:
+                integrity.write_report(f, report)
+            return report["repaired"] or [path]
+        except Exception as e:
+            logutil.error(self.flag, f"Integrity check error for {path}: {e}")
+            return [path]
 
     def is_user_live(self):
         try:
@@ -270,7 +601,13 @@ class TikTok:
                 raise LoginRequired("Login required")
             if not check_exists(json, ["data", "stream_url", "rtmp_pull_url"]):
                 raise ValueError(f"rtmp_pull_url not in response: {json}")
-            return json["data"]["stream_url"]["rtmp_pull_url"]
+            stream_url = json["data"]["stream_url"]
+            if self.quality:
+                url = (stream_url.get("flv_pull_url") or {}).get(QUALITY_KEYS[self.quality])
+                if url:
+                    return url
+                logutil.debug(self.flag, f"Quality {self.quality} not offered, using the default stream")
+            return stream_url["rtmp_pull_url"]
         except ValueError as e:
             raise e
         except LoginRequired as e:
@@ -305,7 +642,7 @@ class TikTok:
     def get_user_from_room_id(self) -> str:
         try:
             url = f"https://www.tiktok.com/api/live/detail/?aid=1988&roomID={self.room_id}"
-            json = requests.get(url, headers=self.headers).json()
+            json = self.req.get(url, headers=self.headers).json()
             if not check_exists(json, ["LiveRoomInfo", "ownerInfo", "uniqueId"]):
                 logutil.error(self.flag, f"LiveRoomInfo.uniqueId not found in json: {json}")
                 raise UserNotFound(ErrorMsg.USERNAME_ERROR)
@@ -324,7 +661,7 @@ class TikTok:
         url = f"https://www.tiktok.com/@{self.id}"
 
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self.req.get(url, headers=self.headers)
             if response.status_code != 200:
                 if response.status_code == 403:
                     logutil.info(self.flag, "Temporary error: 403 Forbidden.")
@@ -411,7 +748,7 @@ class TikTok:
         url = f"https://webcast.tiktok.com/webcast/room/check_alive/?aid=1988&room_ids={room_id}"
 
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self.req.get(url, headers=self.headers)
             if response.status_code != 200:
                 logutil.error(self.flag, f"Failed to load the page. Status code: {response.status_code}")
                 return None
@@ -447,7 +784,7 @@ class TikTok:
         url = f"https://webcast.tiktok.com/webcast/room/info/?aid=1988&room_id={room_id}"
 
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self.req.get(url, headers=self.headers)
             # logutil.debug(self.flag, f"Response: {response.text}")
             if response.status_code != 200:
                 logutil.error(f"Failed to load the page. Status code: {response.status_code}")
@@ -477,7 +814,7 @@ class TikTok:
         url = f"https://webcast.tiktok.com/webcast/room/info/?aid=1988&room_id={room_id}"
 
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self.req.get(url, headers=self.headers)
             # logutil.debug(self.flag, f"Response: {response.text}")
             if response.status_code != 200:
                 logutil.error(self.flag, f"Failed to load the page. Status code: {response.status_code}")
@@ -604,7 +941,25 @@ def get_proxy_session(proxy_url):
         return session
     except Exception as ex:
         logutil.error(ex)
-        return requests
+        return requests.session()
+
+
+def load_cookies(value) -> dict:
+    """Read cookies from a Netscape cookies.txt, a JSON object file, or a "name=value; ..." string"""
+    if os.path.isfile(value):
+        try:
+            jar = MozillaCookieJar(value)
+            jar.load(ignore_discard=True, ignore_expires=True)
+            return {c.name: c.value for c in jar}
+        except LoadError:
+            with open(value, encoding="utf-8") as f:
+                value = f.read().strip()
+            if value.startswith("{"):
+                cookies = json.loads(value)
+                if not all(isinstance(v, str) for v in cookies.values()):
+                    raise ValueError("cookie values must be strings")
+                return cookies
+    return dict(part.strip().split("=", 1) for part in value.split(";") if "=" in part)
 
 
 def login_required(json) -> bool:
@@ -627,6 +982,15 @@ class LiveStatus(IntEnum):
     OFFLINE = 3
 
 
+class CaptureAction(IntEnum):
+    """Enumeration of what a control request did to a capture"""
+
+    NO_CAPTURE = 0
+    DONE = 1
+    DEFERRED = 2
+    SHARED = 3
+
+
 class WaitTime(IntEnum):
     """Enumeration that defines wait times in seconds."""
 
@@ -0,0 +1,61 @@
+import threading
+
+
+class Room:
+    """One live room and the watchers that consume its stream"""
+
+    def __init__(self, room_id):
+        self.room_id = room_id
+        self.owner = None
+        self.watchers = []
+
+
+class RoomRegistry:
+    """Watchers keyed by resolved room_id and stream quality so each rendition of a room is pulled only once.
+    The registry is process-local: watchers in separate processes are not deduplicated.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rooms = {}
+
+    def join(self, room_id, watcher) -> Room:
+        """Attach the watcher to the room, making it the owner if nobody captures it yet"""
+        with self.lock:
+            if watcher.room and watcher.room.room_id != room_id:
+                self._remove(watcher.room, watcher)
+            room = self.rooms.get(room_id)
+            if room is None:
+                room = self.rooms[room_id] = Room(room_id)
+            if watcher not in room.watchers:
+                room.watchers.append(watcher)
+            if room.owner is None:
+                room.owner = watcher
+            return room
+
+    def leave(self, watcher):
+        """Detach the watcher, handing the capture over to the next watcher if it was the owner"""
+        with self.lock:
+            if watcher.room:
+                self._remove(watcher.room, watcher)
+
+    def close(self, room) -> list:
+        """Forget the room and return the watchers that were attached to it"""
+        with self.lock:
+            if self.rooms.get(room.room_id) is room:
+                del self.rooms[room.room_id]
+            watchers = room.watchers
+            room.watchers = []
+            room.owner = None
+            return watchers
+
+    def _remove(self, room, watcher):
+        if watcher in room.watchers:
+            room.watchers.remove(watcher)
+        if room.owner is watcher:
+            room.owner = room.watchers[0] if room.watchers else None
+        if not room.watchers and self.rooms.get(room.room_id) is room:
+            del self.rooms[room.room_id]
+
+
+rooms = RoomRegistry()
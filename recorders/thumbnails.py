@@ -0,0 +1,161 @@
+import glob
+import os
+import queue
+import re
+import threading
+
+import ffmpeg
+
+from utils.utils import logutil
+
+THUMB_WIDTH = 320
+THUMB_QUALITY = 5
+THUMB_NAME = "%05d.jpg"
+THUMB_RE = re.compile(r"^\d{5}\.jpg$")
+SPRITE_TILE_WIDTH = 160
+SPRITE_COLUMNS = 10
+SPRITE_ROWS = 10
+# Whole TS packets, so a chunk dropped for a slow thumbnailer leaves the demuxer in sync
+RELAY_CHUNK_SIZE = 188 * 348
+RELAY_QUEUE_SIZE = 64
+
+
+def escape_pattern(path) -> str:
+    """image2 treats every '%' in the path as a pattern, and titles may contain one"""
+    return path.replace("%", "%%")
+
+
+def get_thumb_dir(session) -> str:
+    return f"{session}_thumbs"
+
+
+def get_preview_file(session, file_format) -> str:
+    return f"{session}_preview.{file_format}"
+
+
+def thumbnail_output(stream, thumb_dir, interval):
+    """Output of the thumbnailer graph writing a small JPEG every interval seconds.
+    Numbering continues across the parts of a session so the sprite sheet stays in order.
+    """
+    os.makedirs(thumb_dir, exist_ok=True)
+    start = len([f for f in os.listdir(thumb_dir) if THUMB_RE.match(f)])
+    video = stream.video.filter("fps", fps=f"1/{interval}").filter("scale", THUMB_WIDTH, -2)
+    return ffmpeg.output(video, os.path.join(escape_pattern(thumb_dir), THUMB_NAME), **{"q:v": THUMB_QUALITY}, start_number=start)
+
+
+def preview_output(stream, preview_file, seconds):
+    """Output of the thumbnailer graph copying the first seconds of the stream, without re-encoding"""
+    return ffmpeg.output(stream, preview_file, c="copy", t=seconds)
+
+
+def relay_output(stream):
+    """Extra output of the capture graph: a stream copy on stdout that feeds the Thumbnailer"""
+    return ffmpeg.output(stream, "pipe:", format="mpegts", c="copy")
+
+
+class Thumbnailer:
+    """Separate ffmpeg process making thumbnails and preview clips from the capture's copy on stdout.
+    Decoding and its errors stay out of the capture, and the relay never lets the capture wait on it.
+    """
+
+    def __init__(self, flag):
+        self.flag = flag
+        # Thumbnails are the only decoded output, and keyframes are all they need
+        self.stream = ffmpeg.input("pipe:", format="mpegts", skip_frame="nokey", loglevel="error")
+        self.outputs = []
+        self.proc = None
+        self.chunks = queue.Queue(RELAY_QUEUE_SIZE)
+        self.threads = []
+        self.dropped = 0
+        self.error = b""
+
+    def add(self, session, file_format, interval, preview):
+        """Add the thumbnails and preview of one watcher of the capture"""
+        if interval:
+            self.outputs.append(thumbnail_output(self.stream, get_thumb_dir(session), interval))
+        preview_file = get_preview_file(session, file_format)
+        if preview and not os.path.exists(preview_file):
+            self.outputs.append(preview_output(self.stream, preview_file, preview))
+
+    def launch(self):
+        return ffmpeg.merge_outputs(*self.outputs).overwrite_output().run_async(pipe_stdin=True, pipe_stderr=True)
+
+    def start(self, source):
+        """Relay source, the capture's stdout, to a new thumbnailer process"""
+        try:
+            self.proc = self.launch()
+        except Exception as e:
+            logutil.warning(self.flag, f"Thumbnailer not started, recording without thumbnails: {e}")
+        self.threads = [
+            threading.Thread(target=self.read, args=(source,), daemon=True),
+            threading.Thread(target=self.write, daemon=True),
+            threading.Thread(target=self.read_errors, daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def read(self, source):
+        """Drain the capture's stdout; chunks the thumbnailer can't take in time are dropped"""
+        for chunk in iter(lambda: source.read(RELAY_CHUNK_SIZE), b""):
+            try:
+                self.chunks.put_nowait(chunk)
+            except queue.Full:
+                self.dropped += 1
+        self.chunks.put(None)
+
+    def write(self):
+        sink = self.proc.stdin if self.proc else None
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                break
+            if sink is None:
+                continue
+            try:
+                sink.write(chunk)
+            except OSError:
+                # The thumbnailer died, e.g. on an audio-only stream; keep draining for the capture's sake
+                sink = None
+        if sink:
+            try:
+                sink.close()
+            except OSError:
+                pass
+
+    def read_errors(self):
+        if self.proc:
+            self.error = self.proc.stderr.read()
+
+    def wait(self):
+        """Wait for the thumbnailer once the capture has ended, logging why it failed if it did"""
+        for thread in self.threads:
+            thread.join()
+        if not self.proc:
+            return
+        self.proc.wait()
+        if self.dropped:
+            logutil.warning(self.flag, f"Thumbnailer fell behind, {self.dropped} chunk(s) skipped")
+        if self.proc.returncode:
+            error = self.error.decode("utf-8", errors="replace").strip()
+            logutil.warning(self.flag, f"Thumbnailer failed, the recording is not affected: {error or self.proc.returncode}")
+
+
+def make_sprites(flag, thumb_dir, session) -> list:
+    """Tile the session's thumbnails into sprite sheets, reading only the small JPEGs"""
+    if not any(THUMB_RE.match(f) for f in os.listdir(thumb_dir)):
+        return []
+    try:
+        (
+            ffmpeg.input(os.path.join(escape_pattern(thumb_dir), THUMB_NAME), framerate=1, start_number=0, **{"loglevel": "error"})
+            .filter("scale", SPRITE_TILE_WIDTH, -2)
+            .filter("tile", f"{SPRITE_COLUMNS}x{SPRITE_ROWS}")
+            .output(f"{escape_pattern(session)}_sprite_%03d.jpg", **{"q:v": THUMB_QUALITY})
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+    except ffmpeg.Error as e:
+        logutil.error(flag, f"Sprite sheet error: {e.stderr.decode('utf-8', errors='replace').strip() if e.stderr else e}")
+        return []
+    sprites = sorted(glob.glob(f"{glob.escape(session)}_sprite_*.jpg"))
+    logutil.info(flag, f"Created {len(sprites)} sprite sheet(s) from {thumb_dir}")
+    return sprites
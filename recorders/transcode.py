@@ -0,0 +1,118 @@
+import math
+import os
+import threading
+
+import ffmpeg
+
+from utils.utils import logutil
+
+# Output profiles: file extension plus ffmpeg output options (None means a bare flag)
+PROFILES = {
+    "mobile": {
+        "ext": "mp4",
+        "args": {"c:v": "libx264", "preset": "veryfast", "b:v": "800k", "maxrate": "1000k", "bufsize": "2000k", "vf": "scale=-2:480", "c:a": "aac", "b:a": "64k", "movflags": "+faststart"},
+    },
+    "audio": {
+        "ext": "m4a",
+        "args": {"vn": None, "c:a": "aac", "b:a": "128k"},
+    },
+}
+THREADS_PER_TRANSCODE = 2
+CORES_PER_CAPTURE = 1
+NICE_CMD = ["nice", "-n", "10"]
+CGROUP_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+
+
+def get_cpu_count() -> int:
+    """Cores this process can actually use: its CPU affinity, capped by a cgroup v2 CPU quota (e.g. a container limit)"""
+    count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    try:
+        with open(CGROUP_CPU_MAX, encoding="utf-8") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            count = min(count, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return count
+
+
+class TranscodeScheduler:
+    """Runs profile transcodes in the background, capped by the cores left over by live captures"""
+
+    def __init__(self, cpu_count=None, threads_per_job=THREADS_PER_TRANSCODE, cores_per_capture=CORES_PER_CAPTURE):
+        self.cpu_count = cpu_count or get_cpu_count()
+        self.threads_per_job = threads_per_job
+        self.cores_per_capture = cores_per_capture
+        self.cond = threading.Condition()
+        self.captures = 0
+        self.running = 0
+
+    def slots(self) -> int:
+        """Number of transcodes allowed to run right now; 0 while captures need every core, so jobs wait"""
+        if self.captures == 0:
+            # Nothing to protect, so even a machine smaller than one job gets to transcode
+            return max(1, self.cpu_count // self.threads_per_job)
+        free = self.cpu_count - self.captures * self.cores_per_capture
+        return max(0, free // self.threads_per_job)
+
+    def capture_started(self):
+        with self.cond:
+            self.captures += 1
+
+    def capture_finished(self):
+        with self.cond:
+            self.captures = max(0, self.captures - 1)
+            self.cond.notify_all()
+
+    def submit(self, flag, path, profiles, on_done=None):
+        """Queue a transcode of path into every known profile in profiles; on_done gets the finished files"""
+        profiles = [p for p in profiles if p in PROFILES]
+        if not profiles:
+            return None
+        thread = threading.Thread(target=self._run, args=(flag, path, profiles, on_done), name=f"transcode {flag}")
+        thread.start()
+        return thread
+
+    def _run(self, flag, path, profiles, on_done):
+        with self.cond:
+            self.cond.wait_for(lambda: self.running < self.slots())
+            self.running += 1
+        try:
+            outputs = transcode(flag, path, profiles, self.threads_per_job)
+        finally:
+            with self.cond:
+                self.running -= 1
+                self.cond.notify_all()
+        if on_done:
+            on_done(outputs)
+
+
+def get_profile_file(path, profile) -> str:
+    stem = os.path.splitext(path)[0]
+    return f"{stem}_{profile}.{PROFILES[profile]['ext']}"
+
+
+def transcode(flag, path, profiles, threads=THREADS_PER_TRANSCODE) -> list:
+    """Decode path once and encode it into every profile from a single ffmpeg graph"""
+    stream = ffmpeg.input(path, **{"loglevel": "error"})
+    outputs = {profile: get_profile_file(path, profile) for profile in profiles}
+    graph = ffmpeg.merge_outputs(*[ffmpeg.output(stream, out, **PROFILES[profile]["args"], threads=threads) for profile, out in outputs.items()]).overwrite_output()
+    # Keep stream-copy captures ahead of transcodes in the CPU queue where the OS allows it
+    cmd = NICE_CMD + ["ffmpeg"] if os.name == "posix" else "ffmpeg"
+    try:
+        logutil.info(flag, f"Transcoding {path} into {', '.join(profiles)}")
+        proc = ffmpeg.run_async(graph, cmd=cmd, pipe_stderr=True)
+        _, err = proc.communicate()
+        if proc.returncode != 0:
+            raise ValueError(err.decode("utf-8", errors="replace").strip())
+        logutil.info(flag, f"Transcode finished: {', '.join(outputs.values())}")
+        return list(outputs.values())
+    except Exception as e:
+        logutil.error(flag, f"Transcode error: {e}")
+        for out in outputs.values():
+            if os.path.exists(out):
+                os.remove(out)
+        return []
+
+
+scheduler = TranscodeScheduler()
@@ -0,0 +1,169 @@
+import argparse
+import json
+
+import pytest
+
+import main
+from recorders.recorders import load_cookies
+from utils.config import ConfigError, get_channel_key, load_config, validate_settings
+from utils.utils import parse_headers
+
+
+def write_config(tmp_path, text, name="config.toml"):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_load_config_merges_defaults(tmp_path):
+    path = write_config(
+        tmp_path,
+        """
+[defaults]
+platform = "TikTok"
+interval = 30
+
+[[channels]]
+id = "a"
+
+[[channels]]
+id = "b"
+interval = 5
+""",
+    )
+    users = load_config(path)
+    assert [(u["id"], u["interval"]) for u in users] == [("a", 30), ("b", 5)]
+    assert get_channel_key(users[0]) == ("TikTok", "a", None, None)
+
+
+def test_load_config_collects_every_error(tmp_path):
+    path = write_config(
+        tmp_path,
+        """
+[extra]
+[[channels]]
+platform = "TikTok"
+interval = true
+[[channels]]
+id = "b"
+format = "avi"
+""",
+    )
+    with pytest.raises(ConfigError) as e:
+        load_config(path)
+    message = str(e.value)
+    assert "unknown section 'extra'" in message
+    assert "'interval' must be int" in message
+    assert "channels[0]: 'id' is required" in message
+    assert "'format' must be one of" in message
+    assert "channels[1] (b): 'platform' is required" in message
+
+
+def test_load_config_rejects_duplicate_channels(tmp_path):
+    path = write_config(
+        tmp_path,
+        """
+[defaults]
+platform = "TikTok"
+[[channels]]
+id = "a"
+format = "ts"
+[[channels]]
+id = "a"
+format = "mp4"
+[[channels]]
+id = "a"
+format = "ts"
+""",
+    )
+    with pytest.raises(ConfigError) as e:
+        load_config(path)
+    assert str(e.value) == "channels[2] (a): same platform, id, output and format as channels[0] (a)"
+
+
+def test_check_channel(tmp_path):
+    cookies = tmp_path / "cookies.json"
+    cookies.write_text("{broken", encoding="utf-8")
+    path = write_config(
+        tmp_path,
+        f"""
+[[channels]]
+platform = "Chzzk"
+id = "a"
+[[channels]]
+platform = "TikTok"
+id = "b"
+cookies = "{cookies}"
+[[channels]]
+platform = "TikTok"
+id = "c"
+upload = "ftp://host/dir"
+""",
+    )
+    with pytest.raises(ConfigError) as e:
+        load_config(path, main.check_channel)
+    errors = str(e.value).splitlines()
+    assert errors[0].startswith("channels[0] (a): platform 'Chzzk' is not supported yet")
+    assert errors[1].startswith("channels[1] (b): cannot read cookies")
+    assert errors[2].startswith("channels[2] (c): invalid upload destination")
+
+
+def test_yaml_config(tmp_path):
+    pytest.importorskip("yaml")
+    path = write_config(tmp_path, "channels:\n  - platform: TikTok\n    id: a\n", "config.yaml")
+    assert load_config(path) == [{"platform": "TikTok", "id": "a"}]
+
+
+def test_validate_settings():
+    assert validate_settings({"interval": 10, "profiles": ["mobile"], "headers": {"A": "b"}}, "x") == []
+    assert validate_settings({"interval": 0}, "x") == ["x: 'interval' must be positive"]
+    assert validate_settings({"thumbnails": -1}, "x") == ["x: 'thumbnails' must not be negative"]
+    assert validate_settings({"profiles": ["4k"]}, "x")[0].startswith("x: 'profiles' entries")
+    assert validate_settings({"headers": {"A": 1}}, "x") == ["x: 'headers' must map strings to strings"]
+
+
+def test_load_cookies(tmp_path):
+    assert load_cookies("sessionid=abc; tt=1") == {"sessionid": "abc", "tt": "1"}
+
+    path = tmp_path / "cookies.json"
+    path.write_text(json.dumps({"sessionid": "abc"}), encoding="utf-8")
+    assert load_cookies(str(path)) == {"sessionid": "abc"}
+
+    path.write_text("# Netscape HTTP Cookie File\n.tiktok.com\tTRUE\t/\tTRUE\t0\tsessionid\tabc\n", encoding="utf-8")
+    assert load_cookies(str(path)) == {"sessionid": "abc"}
+
+    path.write_text(json.dumps({"sessionid": 1}), encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_cookies(str(path))
+
+
+def test_parse_headers():
+    assert parse_headers('{"Referer": "x"}') == {"Referer": "x"}
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_headers("Referer: x")
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_headers('["x"]')
+
+
+def test_create_watchers_skips_failing_channels(tmp_path):
+    watchers = main.create_watchers([{"platform": "Afreeca", "id": "a"}, {"platform": "TikTok", "id": "b", "output": str(tmp_path)}])
+    assert [w.id for w in watchers] == ["b"]
+
+
+def test_load_config_rejects_mixed_rates_for_one_destination(tmp_path):
+    path = write_config(
+        tmp_path,
+        """
+[defaults]
+platform = "TikTok"
+upload = "/mnt/share"
+[[channels]]
+id = "a"
+[[channels]]
+id = "b"
+upload_rate = 512
+""",
+    )
+    with pytest.raises(ConfigError) as e:
+        load_config(path)
+    assert str(e.value) == "channels uploading to /mnt/share must share one upload_rate, got [0, 512]"
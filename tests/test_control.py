@@ -0,0 +1,110 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from recorders.control import ControlServer
+from recorders.recorders import CaptureAction
+
+
+class FakeWatcher:
+    def __init__(self, id, capture=CaptureAction.DONE):
+        self.id = id
+        self.flag = f"[{id}]"
+        self.capture = capture
+        self.interval = 10
+        self.paused = False
+
+    def describe(self):
+        return {"id": self.id, "paused": self.paused, "interval": self.interval}
+
+    def stop(self):
+        return self.capture
+
+    def restart_capture(self):
+        return self.capture
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def set_interval(self, interval):
+        interval = int(interval)
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.interval = interval
+
+
+@pytest.fixture
+def server():
+    watchers = []
+    control = ControlServer(watchers, "127.0.0.1:0")
+    control.start()
+    yield watchers, f"http://127.0.0.1:{control.server.server_address[1]}"
+    control.stop()
+
+
+def request(url, method="GET", data=None):
+    body = json.dumps(data).encode() if data is not None else None
+    req = urllib.request.Request(url, data=body, method=method)
+    try:
+        with urllib.request.urlopen(req) as res:
+            return res.status, json.load(res)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_list_and_find(server):
+    watchers, base = server
+    watchers += [FakeWatcher("a"), FakeWatcher("b")]
+    assert request(f"{base}/channels") == (200, [w.describe() for w in watchers])
+    assert request(f"{base}/channels/b") == (200, [watchers[1].describe()])
+    assert request(f"{base}/channels/c")[0] == 404
+
+
+def test_unknown_action_and_channel(server):
+    watchers, base = server
+    watchers.append(FakeWatcher("a"))
+    assert request(f"{base}/channels/a/explode", "POST")[0] == 404
+    assert request(f"{base}/channels/b/stop", "POST")[0] == 404
+
+
+@pytest.mark.parametrize(
+    "capture, code",
+    [
+        (CaptureAction.DONE, 200),
+        (CaptureAction.DEFERRED, 202),
+        (CaptureAction.NO_CAPTURE, 409),
+        (CaptureAction.SHARED, 409),
+    ],
+)
+def test_capture_actions(server, capture, code):
+    watchers, base = server
+    watchers.append(FakeWatcher("a", capture))
+    status, body = request(f"{base}/channels/a/stop", "POST")
+    assert status == code
+    channels = body["channels"] if code == 409 else body
+    assert channels[0]["result"] == capture.name
+
+
+def test_partial_capture_action_succeeds(server):
+    watchers, base = server
+    watchers += [FakeWatcher("a", CaptureAction.NO_CAPTURE), FakeWatcher("a")]
+    status, body = request(f"{base}/channels/a/restart", "POST")
+    assert status == 200
+    assert [c["result"] for c in body] == ["NO_CAPTURE", "DONE"]
+
+
+def test_pause_and_interval(server):
+    watchers, base = server
+    watchers.append(FakeWatcher("a"))
+    assert request(f"{base}/channels/a/pause", "POST")[0] == 200
+    assert watchers[0].paused
+    assert request(f"{base}/channels/a/interval?interval=30", "POST")[0] == 200
+    assert request(f"{base}/channels/a/interval", "POST", {"interval": 5})[0] == 200
+    assert watchers[0].interval == 5
+    assert request(f"{base}/channels/a/interval", "POST", {"interval": 0})[0] == 400
+    assert request(f"{base}/channels/a/interval", "POST")[0] == 400
@@ -0,0 +1,169 @@
+import json
+import os
+import struct
+
+from recorders import integrity
+
+TS = integrity.TS_PACKET_SIZE
+
+
+def make_report(path, discontinuities=()):
+    return {
+        "file": str(path),
+        "size": os.path.getsize(path),
+        "discontinuities": [{"stream": 0, "pos": pos, "time": 0.0, "jump": 30.0} for pos in discontinuities],
+        "truncated": False,
+        "errors": [],
+        "skipped": [],
+        "repaired": [],
+        "verified": [],
+        "fixed": False,
+        "ok": False,
+    }
+
+
+def write_ts(path, packets, tail=0):
+    with open(path, "wb") as f:
+        for i in range(packets):
+            f.write(bytes([0x47]) + bytes([i % 256]) * (TS - 1))
+        f.write(b"\x00" * tail)
+
+
+def test_parse_packet():
+    assert integrity.parse_packet("0,1.500000,0.033333,4096,376") == (0, 1.5, 4096, 376)
+    assert integrity.parse_packet("1,N/A,N/A,N/A,N/A") == (1, None, None, None)
+    assert integrity.parse_packet("[mpegts @ 0x1] Packet corrupt") is None
+    assert integrity.parse_packet("x,1,2,3,4") is None
+
+
+def test_split_ts_cuts_near_the_start(tmp_path):
+    path = tmp_path / "a.ts"
+    write_ts(path, 20000)
+    cut = 2000 * TS  # ~376 KB into the file
+    report = make_report(path, [cut])
+
+    pieces = integrity.split_ts(str(path), report)
+
+    assert len(pieces) == 2
+    assert os.path.getsize(pieces[0]) == cut
+    assert os.path.getsize(pieces[0]) + os.path.getsize(pieces[1]) == 20000 * TS
+    assert not path.exists()
+
+
+def test_split_ts_merges_clustered_jumps(tmp_path):
+    path = tmp_path / "a.ts"
+    write_ts(path, 30000)
+    # Video and audio jump a few packets apart: one cut at the first of them
+    report = make_report(path, [10000 * TS, 10003 * TS + 5])
+
+    pieces = integrity.split_ts(str(path), report)
+
+    assert len(pieces) == 2
+    assert os.path.getsize(pieces[0]) == 10000 * TS
+
+
+def test_split_ts_records_edge_jumps(tmp_path):
+    path = tmp_path / "a.ts"
+    write_ts(path, 100)
+    report = make_report(path, [0])
+
+    assert integrity.split_ts(str(path), report) == [str(path)]
+    assert report["skipped"] == [{"pos": 0, "reason": "at file edge"}]
+    assert not report["fixed"]
+
+
+def test_split_ts_trims_truncated_tail(tmp_path):
+    path = tmp_path / "a.ts"
+    write_ts(path, 100, tail=50)
+    report = make_report(path)
+    report["truncated"] = True
+
+    assert integrity.split_ts(str(path), report) == [str(path)]
+    assert os.path.getsize(path) == 100 * TS
+
+
+def flv_tag(tag_type, data, timestamp=0):
+    header = bytes([tag_type]) + len(data).to_bytes(3, "big") + timestamp.to_bytes(3, "big") + b"\x00" * 4
+    return header + data + struct.pack(">I", len(data) + 11)
+
+
+FLV_HEADER = b"FLV\x01\x05\x00\x00\x00\x09" + b"\x00\x00\x00\x00"
+FLV_CONFIG = flv_tag(18, b"meta") + flv_tag(9, b"\x17\x00seq") + flv_tag(8, b"\xaf\x00c")
+
+
+def test_split_flv_repeats_config_in_each_piece(tmp_path):
+    path = tmp_path / "a.flv"
+    media = [flv_tag(9, b"\x17\x01" + b"v" * 20000, ts) for ts in range(0, 200)]
+    jumped = [flv_tag(9, b"\x17\x01" + b"v" * 20000, 9000 + ts) for ts in range(0, 100)]
+    cut = len(FLV_HEADER + FLV_CONFIG) + sum(map(len, media))
+    path.write_bytes(FLV_HEADER + FLV_CONFIG + b"".join(media) + b"".join(jumped) + b"\x09\x00")
+    report = make_report(path, [cut, cut + 5])
+
+    pieces = integrity.split_flv(str(path), report)
+
+    assert len(pieces) == 2
+    first, second = (open(p, "rb").read() for p in pieces)
+    assert first == FLV_HEADER + FLV_CONFIG + b"".join(media)
+    # The truncated tail is gone and the config tags carry the piece's first timestamp
+    restamped = flv_tag(18, b"meta", 9000) + flv_tag(9, b"\x17\x00seq", 9000) + flv_tag(8, b"\xaf\x00c", 9000)
+    assert second == FLV_HEADER + restamped + b"".join(jumped)
+    assert report["skipped"] == [{"pos": cut + 5, "reason": "not at a tag boundary"}]
+
+
+def test_get_cut_times():
+    jumps = [
+        {"stream": 0, "pos": 10, "time": 100.0, "jump": 30.0},
+        {"stream": 1, "pos": 12, "time": 100.5, "jump": 29.6},
+        {"stream": 0, "pos": 50, "time": 300.0, "jump": -250.0},
+    ]
+    report = {"discontinuities": jumps, "skipped": []}
+    assert integrity.get_cut_times(report) == [130.0]
+    assert report["skipped"] == [{"pos": 50, "reason": "backward jump"}]
+
+
+def test_repair_is_verified(tmp_path, monkeypatch):
+    path = tmp_path / "a.ts"
+    write_ts(path, 20000)
+    report = make_report(path, [2000 * TS, 15000 * TS])
+    # The second piece still jumps: the repair must not be reported as a fix
+    monkeypatch.setattr(integrity, "scan_file", lambda p: {"file": p, "discontinuities": [], "truncated": False, "ok": not p.endswith("part01.ts")})
+
+    pieces = integrity.repair_file(str(path), report)
+
+    assert len(pieces) == 3
+    assert [r["ok"] for r in report["verified"]] == [True, False, True]
+    assert not report["fixed"]
+
+
+def test_flv_truncation(tmp_path):
+    path = tmp_path / "a.flv"
+    complete = b"FLV\x01\x05\x00\x00\x00\x09" + b"\x00\x00\x00\x00" + flv_tag(9, b"v" * 100) + flv_tag(8, b"a" * 20)
+    path.write_bytes(complete)
+    assert not integrity.is_truncated(str(path))
+    path.write_bytes(complete[:-30])
+    assert integrity.is_truncated(str(path))
+
+
+def mp4_box(box_type, payload=b""):
+    return struct.pack(">I4s", len(payload) + 8, box_type) + payload
+
+
+def test_mp4_truncation(tmp_path):
+    path = tmp_path / "a.mp4"
+    path.write_bytes(mp4_box(b"ftyp", b"isom") + mp4_box(b"mdat", b"x" * 100) + mp4_box(b"moov", b"y" * 10))
+    assert not integrity.is_truncated(str(path))
+    # Killed before the moov box was written
+    path.write_bytes(mp4_box(b"ftyp", b"isom") + mp4_box(b"mdat", b"x" * 100))
+    assert integrity.is_truncated(str(path))
+    # mdat header claims more data than the file holds
+    path.write_bytes(mp4_box(b"ftyp", b"isom") + mp4_box(b"mdat", b"x" * 100)[:50])
+    assert integrity.is_truncated(str(path))
+
+
+def test_write_report(tmp_path):
+    path = str(tmp_path / "a.ts")
+    integrity.write_report(path, {"ok": True})
+    with open(integrity.get_report_file(path), encoding="utf-8") as f:
+        assert json.load(f) == {"ok": True}
+    integrity.remove_report(path)
+    assert not os.path.exists(integrity.get_report_file(path))
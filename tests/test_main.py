@@ -0,0 +1,46 @@
+import main
+from recorders.recorders import Blacklisted
+
+
+class DyingWatcher:
+    def __init__(self, id):
+        self.id = id
+        self.flag = f"[{id}]"
+        self.user = {"platform": "TikTok", "id": id}
+        self.left = False
+        self.finished = False
+
+    def run(self):
+        raise Blacklisted("blacklisted")
+
+    def leave_room(self):
+        self.left = True
+
+    def finish_recording(self):
+        self.finished = True
+
+
+def test_run_watcher_logs_fatal_errors():
+    w = DyingWatcher("a")
+    main.run_watcher(w)
+    assert w.left and w.finished
+
+
+def test_dead_watchers_are_dropped():
+    watchers = [DyingWatcher("a"), DyingWatcher("b")]
+    # Returns once nothing is left to supervise instead of idling forever
+    main.run_watchers(watchers)
+    assert watchers == []
+
+
+def test_reload_restarts_dropped_channels(tmp_path, monkeypatch):
+    config = tmp_path / "config.toml"
+    config.write_text(f'[[channels]]\nplatform = "TikTok"\nid = "a"\noutput = "{tmp_path}"\n', encoding="utf-8")
+    started = []
+    monkeypatch.setattr(main, "start_watcher", lambda w, threads: started.append(w))
+    watchers = []
+
+    main.reload_config(str(config), watchers, {}, {})
+
+    assert [w.id for w in watchers] == ["a"]
+    assert started == watchers
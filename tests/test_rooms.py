@@ -0,0 +1,129 @@
+import threading
+
+from recorders.recorders import TikTok
+from recorders.rooms import RoomRegistry
+
+
+class Watcher:
+    def __init__(self, name):
+        self.name = name
+        self.room = None
+
+
+def join(registry, room_id, watcher):
+    watcher.room = registry.join(room_id, watcher)
+    return watcher.room
+
+
+def test_first_watcher_owns_the_room():
+    registry = RoomRegistry()
+    a, b = Watcher("a"), Watcher("b")
+    room = join(registry, "1", a)
+    assert join(registry, "1", b) is room
+    assert room.owner is a
+    assert room.watchers == [a, b]
+
+
+def test_join_is_idempotent():
+    registry = RoomRegistry()
+    a = Watcher("a")
+    join(registry, "1", a)
+    room = join(registry, "1", a)
+    assert room.watchers == [a]
+
+
+def test_leave_hands_ownership_over():
+    registry = RoomRegistry()
+    a, b, c = Watcher("a"), Watcher("b"), Watcher("c")
+    room = join(registry, "1", a)
+    join(registry, "1", b)
+    join(registry, "1", c)
+
+    registry.leave(a)
+    assert room.owner is b
+    assert room.watchers == [b, c]
+
+    registry.leave(c)
+    assert room.owner is b
+
+
+def test_last_leave_forgets_the_room():
+    registry = RoomRegistry()
+    a = Watcher("a")
+    room = join(registry, "1", a)
+    registry.leave(a)
+    assert room.owner is None
+    assert "1" not in registry.rooms
+    assert join(registry, "1", a) is not room
+
+
+def test_joining_another_room_leaves_the_old_one():
+    registry = RoomRegistry()
+    a, b = Watcher("a"), Watcher("b")
+    old = join(registry, "1", a)
+    join(registry, "1", b)
+    join(registry, "2", a)
+    assert old.watchers == [b]
+    assert old.owner is b
+    assert registry.rooms["2"].owner is a
+
+
+def test_close_returns_watchers_and_forgets_the_room():
+    registry = RoomRegistry()
+    a, b = Watcher("a"), Watcher("b")
+    room = join(registry, "1", a)
+    join(registry, "1", b)
+
+    assert registry.close(room) == [a, b]
+    assert room.watchers == []
+    assert room.owner is None
+    assert "1" not in registry.rooms
+    # Closing a room that was already replaced leaves the new one alone
+    new = join(registry, "1", a)
+    registry.close(room)
+    assert registry.rooms["1"] is new
+
+
+class FakeFinisher:
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        self.jobs.append((fn.__name__, args))
+
+
+def test_session_is_finished_once(tmp_path):
+    w = TikTok({"platform": "TikTok", "id": "a", "output": str(tmp_path)})
+    w.finisher = FakeFinisher()
+    w.close_part("a.ts")
+    w.close_part("b.ts")
+
+    # The owner's close_room and the follower's own hold() race to finish the same session
+    threads = [threading.Thread(target=w.finish_recording) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    finishes = [args for name, args in w.finisher.jobs if name == "finish_session"]
+    assert len(finishes) == 1
+    assert finishes[0][0] == ["a.ts", "b.ts"]
+    assert not w.finish_recording()
+
+
+def test_rooms_are_shared_per_quality(tmp_path):
+    def watcher(id, quality):
+        w = TikTok({"platform": "TikTok", "id": id, "output": str(tmp_path), "quality": quality})
+        w.room_id = "42"
+        return w
+
+    hd, ld, hd2 = watcher("a", "hd"), watcher("b", "ld"), watcher("c", "hd")
+    try:
+        assert hd.join_room()
+        # Another rendition needs its own pull
+        assert ld.join_room()
+        assert not hd2.join_room()
+        assert hd2.room is hd.room
+    finally:
+        for w in (hd, ld, hd2):
+            w.leave_room()
@@ -0,0 +1,89 @@
+import argparse
+import io
+import subprocess
+import sys
+
+import ffmpeg
+import pytest
+
+from recorders import thumbnails
+from utils.utils import parse_count
+
+
+def test_escape_pattern():
+    assert thumbnails.escape_pattern("50% off") == "50%% off"
+
+
+def test_session_files():
+    assert thumbnails.get_thumb_dir("out/a") == "out/a_thumbs"
+    assert thumbnails.get_preview_file("out/a", "mp4") == "out/a_preview.mp4"
+
+
+def test_thumbnail_numbering_continues(tmp_path):
+    thumb_dir = tmp_path / "a_thumbs"
+    thumb_dir.mkdir()
+    for i in range(3):
+        (thumb_dir / f"{i:05d}.jpg").write_bytes(b"")
+    (thumb_dir / "other.jpg").write_bytes(b"")
+
+    args = thumbnails.thumbnail_output(ffmpeg.input("pipe:"), str(thumb_dir), 10).get_args()
+
+    assert args[args.index("-start_number") + 1] == "3"
+    assert "fps=fps=1/10" in args[args.index("-filter_complex") + 1]
+
+
+def test_thumbnailer_outputs(tmp_path):
+    session = str(tmp_path / "a")
+    thumbnailer = thumbnails.Thumbnailer("[a]")
+    thumbnailer.add(session, "ts", 0, 0)
+    assert thumbnailer.outputs == []
+
+    thumbnailer.add(session, "ts", 10, 30)
+    assert len(thumbnailer.outputs) == 2
+
+    # The preview is made once per session
+    (tmp_path / "a_preview.ts").write_bytes(b"")
+    thumbnailer.add(session, "ts", 0, 30)
+    assert len(thumbnailer.outputs) == 2
+
+
+def fake_process(code):
+    # Stands in for ffmpeg: consume a little input, then exit
+    script = f"import sys; sys.stdin.buffer.read(10); sys.stderr.write('Stream map 0:v matches no streams'); sys.exit({code})"
+    return subprocess.Popen([sys.executable, "-c", script], stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def test_failing_thumbnailer_does_not_block_the_capture(tmp_path, monkeypatch):
+    thumbnailer = thumbnails.Thumbnailer("[a]")
+    monkeypatch.setattr(thumbnailer, "launch", lambda: fake_process(1))
+    source = io.BytesIO(b"\x47" * thumbnails.RELAY_CHUNK_SIZE * 200)
+
+    thumbnailer.start(source)
+    thumbnailer.wait()
+
+    # The whole capture output was drained even though the thumbnailer died early
+    assert source.tell() == len(source.getvalue())
+    assert thumbnailer.proc.returncode == 1
+    assert b"matches no streams" in thumbnailer.error
+
+
+def test_thumbnailer_that_cannot_start(monkeypatch):
+    thumbnailer = thumbnails.Thumbnailer("[a]")
+
+    def launch():
+        raise FileNotFoundError("ffmpeg")
+
+    monkeypatch.setattr(thumbnailer, "launch", launch)
+    source = io.BytesIO(b"\x47" * 1000)
+    thumbnailer.start(source)
+    thumbnailer.wait()
+    assert source.tell() == 1000
+
+
+def test_parse_count():
+    assert parse_count("0") == 0
+    assert parse_count("15") == 15
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_count("-5")
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_count("ten")
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from recorders import transcode
+from recorders.recorders import TikTok
+from recorders.transcode import TranscodeScheduler
+
+
+@pytest.mark.parametrize(
+    "cpu_count, captures, expected",
+    [
+        (1, 0, 1),
+        (1, 1, 0),
+        (1, 3, 0),
+        (2, 0, 1),
+        (2, 1, 0),
+        (2, 2, 0),
+        (8, 0, 4),
+        (8, 1, 3),
+        (8, 2, 3),
+        (8, 4, 2),
+        (8, 7, 0),
+        (8, 10, 0),
+    ],
+)
+def test_slots(cpu_count, captures, expected):
+    scheduler = TranscodeScheduler(cpu_count=cpu_count)
+    for _ in range(captures):
+        scheduler.capture_started()
+    assert scheduler.slots() == expected
+
+
+def test_capture_finished_never_goes_negative():
+    scheduler = TranscodeScheduler(cpu_count=8)
+    scheduler.capture_finished()
+    assert scheduler.captures == 0
+
+
+def test_jobs_wait_until_a_capture_ends(monkeypatch):
+    started = threading.Event()
+    monkeypatch.setattr(transcode, "transcode", lambda flag, path, profiles, threads: started.set() or [path])
+    scheduler = TranscodeScheduler(cpu_count=2)
+    scheduler.capture_started()
+    done = []
+
+    thread = scheduler.submit("[t]", "a.ts", ["audio"], on_done=done.append)
+    assert not started.wait(0.2)
+
+    scheduler.capture_finished()
+    thread.join(2)
+    assert started.is_set()
+    assert done == [["a.ts"]]
+
+
+def test_unknown_profiles_are_ignored():
+    assert TranscodeScheduler(cpu_count=8).submit("[t]", "a.ts", ["nope"]) is None
+
+
+def test_cpu_count_follows_affinity_and_quota(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcode.os, "sched_getaffinity", lambda pid: {0, 1, 2, 3}, raising=False)
+    monkeypatch.setattr(transcode, "CGROUP_CPU_MAX", str(tmp_path / "missing"))
+    assert transcode.get_cpu_count() == 4
+
+    cpu_max = tmp_path / "cpu.max"
+    monkeypatch.setattr(transcode, "CGROUP_CPU_MAX", str(cpu_max))
+    cpu_max.write_text("150000 100000\n")
+    assert transcode.get_cpu_count() == 2
+    cpu_max.write_text("max 100000\n")
+    assert transcode.get_cpu_count() == 4
+
+
+def test_failed_transcode_keeps_the_source(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    source = tmp_path / "a.ts"
+    source.write_bytes(b"x")
+    w = TikTok({"platform": "TikTok", "id": "a", "output": str(tmp_path), "upload": str(tmp_path / "remote"), "upload_delete": True})
+
+    w.upload_transcoded(w.uploader, str(source), [])
+    assert source.exists()
+
+    out = tmp_path / "a_audio.m4a"
+    out.write_bytes(b"y")
+    w.upload_transcoded(w.uploader, str(source), [str(out)])
+    w.uploader.wait([str(out)])
+    assert not source.exists()
+    assert (tmp_path / "remote" / "a_audio.m4a").exists()
@@ -0,0 +1,242 @@
+import json
+import time
+
+import pytest
+
+from recorders import uploader
+from recorders.recorders import TikTok
+from recorders.uploader import LocalBackend, Throttle, Uploader, get_backend
+
+
+def test_throttle_unlimited():
+    throttle = Throttle(0)
+    start = time.monotonic()
+    throttle.consume(10**9)
+    assert time.monotonic() - start < 0.1
+
+
+def test_throttle_waits_for_debt():
+    throttle = Throttle(1000)
+    start = time.monotonic()
+    # The first second's worth is allowed at once, the rest has to be earned
+    throttle.consume(1000)
+    throttle.consume(300)
+    assert time.monotonic() - start >= 0.25
+
+
+def test_get_backend(tmp_path):
+    assert isinstance(get_backend(str(tmp_path / "a")), LocalBackend)
+    backend = get_backend(f"file://{tmp_path}/b")
+    assert backend.root == f"{tmp_path}/b"
+    with pytest.raises(ValueError):
+        get_backend("ftp://host/dir")
+
+
+def test_get_backend_missing_library(monkeypatch):
+    monkeypatch.setattr(uploader, "boto3", None)
+    with pytest.raises(ValueError, match="boto3"):
+        get_backend("s3://bucket/prefix")
+
+
+def make_uploader(tmp_path):
+    return Uploader(LocalBackend(str(tmp_path / "remote")), str(tmp_path / "state.json"))
+
+
+def test_upload_and_delete_local(tmp_path):
+    path = tmp_path / "part.ts"
+    path.write_bytes(b"x" * 5000)
+    up = make_uploader(tmp_path)
+
+    up.enqueue(str(path), delete_local=True)
+    up.wait([str(path)])
+
+    assert (tmp_path / "remote" / "part.ts").read_bytes() == b"x" * 5000
+    assert not path.exists()
+    assert str(path) not in up.state
+
+
+def test_upload_keeps_local_and_records_done(tmp_path):
+    path = tmp_path / "part.ts"
+    path.write_bytes(b"x" * 5000)
+    up = make_uploader(tmp_path)
+
+    up.enqueue(str(path))
+    up.wait([str(path)])
+
+    assert path.exists()
+    assert up.is_uploaded(str(path))
+    # Already uploaded with the same size: nothing is queued again
+    up.enqueue(str(path))
+    assert not up.pending
+
+
+def test_upload_resumes_partial_copy(tmp_path):
+    path = tmp_path / "part.ts"
+    path.write_bytes(b"a" * 3000 + b"b" * 2000)
+    remote = tmp_path / "remote"
+    remote.mkdir()
+    (remote / "part.ts.part").write_bytes(b"a" * 3000)
+    up = make_uploader(tmp_path)
+
+    up.enqueue(str(path))
+    up.wait([str(path)])
+
+    assert (remote / "part.ts").read_bytes() == path.read_bytes()
+
+
+def test_parts_are_the_deliverable(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    remote = tmp_path / "remote"
+    w = TikTok({"platform": "TikTok", "id": "a", "output": str(tmp_path), "upload": str(remote), "upload_delete": True})
+    path = tmp_path / "part.ts"
+    path.write_bytes(b"x" * 5000)
+
+    w.close_part(str(path))
+    w.finish_recording()
+    assert w.video_list == []
+    w.finisher.shutdown()
+
+    # Uploaded once as it closed, then freed locally; nothing is uploaded a second time
+    assert (remote / "part.ts").read_bytes() == b"x" * 5000
+    assert not path.exists()
+    assert w.uploader.state == {}
+
+
+class StubS3:
+    """Just enough of a boto3 S3 client to run multipart uploads in memory"""
+
+    class ClientError(Exception):
+        pass
+
+    class NoSuchUpload(ClientError):
+        pass
+
+    def __init__(self):
+        self.exceptions = self
+        self.objects = {}
+        self.uploads = {}
+        self.created = 0
+        self.sent = []
+        self.fail_parts = set()
+        self.expire = False
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.created += 1
+        upload_id = f"upload-{self.created}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber in self.fail_parts:
+            raise ConnectionError(f"part {PartNumber} interrupted")
+        if UploadId not in self.uploads:
+            raise self.NoSuchUpload(UploadId)
+        self.uploads[UploadId][PartNumber] = Body
+        self.sent.append(PartNumber)
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        if self.expire:
+            self.expire = False
+            del self.uploads[UploadId]
+        if UploadId not in self.uploads:
+            raise self.NoSuchUpload(UploadId)
+        parts = self.uploads.pop(UploadId)
+        assert [p["ETag"] for p in MultipartUpload["Parts"]] == [f"etag-{n}" for n in sorted(parts)]
+        self.objects[Key] = b"".join(parts[n] for n in sorted(parts))
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self.ClientError(Key)
+        return {"ContentLength": len(self.objects[Key])}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    client = StubS3()
+    monkeypatch.setattr(uploader, "boto3", type("boto3", (), {"client": staticmethod(lambda *args, **kwargs: client)}))
+    monkeypatch.setattr(uploader, "PART_SIZE", 1000)
+    monkeypatch.setattr(uploader, "RETRY_WAIT", 0)
+    return client
+
+
+def test_s3_multipart_resumes_from_saved_parts(tmp_path, s3):
+    path = tmp_path / "part.ts"
+    data = bytes(range(256)) * 20
+    path.write_bytes(data)
+    state_file = str(tmp_path / "state.json")
+
+    # Part 3 keeps failing, so every attempt is used up and the upload is left for the next start
+    s3.fail_parts = {3}
+    first = Uploader(get_backend("s3://bucket/rec"), state_file)
+    first.enqueue(str(path))
+    first.wait([str(path)])
+    entry = json.loads(open(state_file).read())[str(path)]
+    assert not entry["done"]
+    assert entry["upload_id"] == "upload-1"
+    assert set(entry["parts"]) == {"1", "2", "4", "5", "6"}
+
+    s3.fail_parts = set()
+    s3.sent = []
+    second = Uploader(get_backend("s3://bucket/rec"), state_file)
+    second.wait([str(path)])
+
+    assert s3.sent == [3]
+    assert s3.created == 1
+    assert s3.objects["rec/part.ts"] == data
+    assert second.is_uploaded(str(path))
+
+
+def test_s3_expired_multipart_starts_over(tmp_path, s3):
+    path = tmp_path / "part.ts"
+    data = b"z" * 2500
+    path.write_bytes(data)
+    s3.expire = True
+    up = Uploader(get_backend("s3://bucket"), str(tmp_path / "state.json"))
+
+    up.enqueue(str(path))
+    up.wait([str(path)])
+
+    assert s3.created == 2
+    assert s3.objects["part.ts"] == data
+    assert up.is_uploaded(str(path))
+
+
+def test_s3_small_file_is_one_put(tmp_path, s3):
+    path = tmp_path / "thumb.jpg"
+    path.write_bytes(b"j" * 10)
+    up = Uploader(get_backend("s3://bucket/p/"), str(tmp_path / "state.json"))
+
+    up.enqueue(str(path), delete_local=True)
+    up.wait([str(path)])
+
+    assert s3.objects == {"p/thumb.jpg": b"j" * 10}
+    assert s3.created == 0
+    assert not path.exists()
+
+
+def test_rate_change_updates_the_shared_uploader(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    url = str(tmp_path / "remote")
+    up = uploader.get_uploader(url, 1024)
+    assert uploader.get_uploader(url, 4096) is up
+    assert up.throttle.rate == 4096
+
+
+def test_session_keeps_its_uploader(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    w = TikTok({"platform": "TikTok", "id": "a", "output": str(tmp_path), "upload": str(tmp_path / "one")})
+    path = tmp_path / "part.ts"
+    path.write_bytes(b"x" * 5000)
+    w.close_part(str(path))
+
+    # A reload moves the channel to another destination in the middle of the session
+    w.configure({**w.user, "upload": str(tmp_path / "two")})
+    w.finish_recording()
+    w.finisher.shutdown()
+
+    assert (tmp_path / "one" / "part.ts").exists()
+    assert not (tmp_path / "two" / "part.ts").exists()
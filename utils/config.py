@@ -0,0 +1,142 @@
+import os
+import tomllib
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from utils.utils import FORMAT_CHOICES, PLATFORM_CHOICES, PROFILE_CHOICES, QUALITY_CHOICES
+
+# Settings a channel may set, either directly or through [defaults]
+SETTINGS = {
+    "platform": str,
+    "id": str,
+    "name": str,
+    "interval": int,
+    "format": str,
+    "quality": str,
+    "proxy": str,
+    "cookies": str,
+    "headers": dict,
+    "output": str,
+    "profiles": list,
+    "thumbnails": int,
+    "preview": int,
+    "upload": str,
+    "upload_rate": int,
+    "upload_delete": bool,
+}
+CHOICES = {
+    "platform": PLATFORM_CHOICES,
+    "format": FORMAT_CHOICES,
+    "quality": QUALITY_CHOICES,
+}
+
+# TOMLDecodeError is a ValueError
+PARSE_ERRORS = (OSError, ValueError) + ((yaml.YAMLError,) if yaml else ())
+
+
+class ConfigError(Exception):
+    pass
+
+
+def read_config(path) -> dict:
+    """Parse a TOML or YAML file into a dict"""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext in (".yaml", ".yml"):
+            if yaml is None:
+                raise ConfigError("PyYAML is required for YAML config files")
+            with open(path, encoding="utf-8") as f:
+                data = yaml.safe_load(f) or {}
+        else:
+            with open(path, "rb") as f:
+                data = tomllib.load(f)
+    except PARSE_ERRORS as e:
+        raise ConfigError(f"Cannot read {path}: {e}")
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path} must contain a table/mapping at the top level")
+    return data
+
+
+def validate_settings(settings, where) -> list:
+    """Return a list of problems with one [defaults] or [[channels]] entry"""
+    errors = []
+    for key, value in settings.items():
+        expected = SETTINGS.get(key)
+        if expected is None:
+            errors.append(f"{where}: unknown setting '{key}'")
+        # bool is an int subclass; don't let `interval = true` through
+        elif not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+            errors.append(f"{where}: '{key}' must be {expected.__name__}, got {type(value).__name__}")
+        elif key in CHOICES and value not in CHOICES[key]:
+            errors.append(f"{where}: '{key}' must be one of {CHOICES[key]}, got '{value}'")
+        elif key == "interval" and value <= 0:
+            errors.append(f"{where}: 'interval' must be positive")
+        elif key in ("upload_rate", "thumbnails", "preview") and value < 0:
+            errors.append(f"{where}: '{key}' must not be negative")
+        elif key == "profiles" and any(p not in PROFILE_CHOICES for p in value):
+            errors.append(f"{where}: 'profiles' entries must be in {PROFILE_CHOICES}")
+        elif key == "headers" and not all(isinstance(k, str) and isinstance(v, str) for k, v in value.items()):
+            errors.append(f"{where}: 'headers' must map strings to strings")
+    return errors
+
+
+def load_config(path, check=None) -> list:
+    """Load the config file and return one settings dict per channel, defaults merged in.
+    check(user) may return further problems with a merged channel, e.g. settings that need the recorder to verify.
+
+    [defaults]
+    platform = "TikTok"
+    interval = 10
+
+    [[channels]]
+    id = "someone"
+    format = "mp4"
+    """
+    data = read_config(path)
+    errors = [f"unknown section '{key}'" for key in data if key not in ("defaults", "channels")]
+    defaults = data.get("defaults", {})
+    channels = data.get("channels", [])
+    if not isinstance(defaults, dict):
+        raise ConfigError("'defaults' must be a table")
+    if not isinstance(channels, list) or not all(isinstance(c, dict) for c in channels):
+        raise ConfigError("'channels' must be a list of tables")
+
+    default_errors = validate_settings(defaults, "defaults")
+    errors += default_errors
+    merged = []
+    keys = {}
+    for i, channel in enumerate(channels):
+        where = f"channels[{i}]" + (f" ({channel['id']})" if "id" in channel else "")
+        channel_errors = validate_settings(channel, where)
+        user = {**defaults, **channel}
+        channel_errors += [f"{where}: '{key}' is required" for key in ("platform", "id") if key not in user]
+        errors += channel_errors
+        if channel_errors or default_errors:
+            continue
+        # A reload matches channels by this key, so two channels must never share it
+        key = get_channel_key(user)
+        if key in keys:
+            errors.append(f"{where}: same platform, id, output and format as {keys[key]}")
+        keys.setdefault(key, where)
+        if check:
+            errors += [f"{where}: {e}" for e in check(user)]
+        merged.append(user)
+    # Channels uploading to one destination share its uploader, and with it one rate cap
+    rates = {}
+    for user in merged:
+        if user.get("upload"):
+            rates.setdefault(user["upload"], set()).add(user.get("upload_rate", 0))
+    errors += [f"channels uploading to {url} must share one upload_rate, got {sorted(r)}" for url, r in rates.items() if len(r) > 1]
+    if not channels:
+        errors.append("no channels configured")
+    if errors:
+        raise ConfigError("\n".join(errors))
+    return merged
+
+
+def get_channel_key(user) -> tuple:
+    """Identity of a channel across reloads; changing one of these replaces the watcher, any other setting changes in place"""
+    return user["platform"], user["id"], user.get("output"), user.get("format")